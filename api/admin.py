@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, status
+
+from db.backup import backup_job
+from db.coalescer import write_coalescer
+from utils.admission import admission_control, threadpool_usage
+from utils.broadcaster import change_stream
+from utils.metrics import metrics
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+)
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+async def get_metrics():
+    return {
+        **metrics.snapshot(),
+        "write_queue_depth": write_coalescer.depth(),
+        "in_flight": admission_control.in_flight(),
+        "threadpool": threadpool_usage(),
+        "stream_subscribers": change_stream.subscriber_count(),
+    }
+
+
+@router.post("/backup", status_code=status.HTTP_202_ACCEPTED)
+async def start_backup(compress: bool = False):
+    if not backup_job.start(compress):
+        raise HTTPException(status_code=409, detail="A backup is already running")
+
+    return backup_job.status()
+
+
+@router.get("/backup", status_code=status.HTTP_200_OK)
+async def get_backup():
+    return backup_job.status()
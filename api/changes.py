@@ -0,0 +1,154 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+import config
+from db import get_engine
+from db.changes import latest_cursor, oldest_cursor, read_changes
+from utils.admission import admission_control
+from utils.broadcaster import change_stream
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["changes"],
+    dependencies=[Depends(admission_control)],
+)
+
+REPLAY_PAGE_SIZE = 1000
+
+
+def check_cursor(session: Session, since: int):
+    # changes before the cursor were compacted, the client has to resync
+    if since < oldest_cursor(session):
+        raise HTTPException(
+            status_code=410,
+            detail="Cursor is too old, resync and continue from the cursor "
+            "returned by GET /changes/cursor before the resync",
+        )
+
+
+def check_since(since: int):
+    with Session(get_engine(primary=True)) as session:
+        check_cursor(session, since)
+
+
+def replay_page(cursor: int) -> list:
+    # in a worker thread, off the event loop serving the other streams
+    with Session(get_engine(primary=True)) as session:
+        return read_changes(session, cursor, REPLAY_PAGE_SIZE)
+
+
+def format_event(change: dict) -> str:
+    data = json.dumps(jsonable_encoder(change))
+
+    return (
+        f"id: {change['cursor']}\n"
+        f"event: {change['entity']}.{change['operation']}\n"
+        f"data: {data}\n\n"
+    )
+
+
+@router.get("/cursor", status_code=status.HTTP_200_OK)
+def get_latest_cursor():
+    engine = get_engine()
+
+    with Session(engine) as session:
+        return {"cursor": latest_cursor(session)}
+
+
+@router.get("/stream", status_code=status.HTTP_200_OK)
+async def stream_changes(
+    company_id: Optional[str] = None,
+    since: Optional[int] = Query(default=None, ge=0),
+    last_event_id: Optional[int] = Header(default=None, alias="Last-Event-ID"),
+):
+    # browsers resume from the last event they saw after a reconnect
+    if last_event_id is not None:
+        since = last_event_id
+
+    # the stream follows the primary, replay from it as well so nothing
+    # between the read snapshot and the live events is missed
+    if since is not None:
+        await asyncio.to_thread(check_since, since)
+
+    # employee changes carry the companies the employee has roles at
+    def matches(change: dict) -> bool:
+        return (
+            company_id is None
+            or change["company_id"] == company_id
+            or company_id in (change["company_ids"] or [])
+        )
+
+    # subscribe before replaying so nothing is missed in between
+    subscription = change_stream.subscribe(matches)
+
+    async def events():
+        cursor = since or 0
+
+        try:
+            # catch up from the change log
+            while since is not None:
+                changes = await asyncio.to_thread(replay_page, cursor)
+
+                for change in changes:
+                    cursor = change["cursor"]
+
+                    if matches(change):
+                        yield format_event(change)
+
+                if len(changes) < REPLAY_PAGE_SIZE:
+                    break
+
+            # then follow new changes
+            while True:
+                try:
+                    change = await asyncio.wait_for(
+                        subscription.queue.get(), config.CHANGE_STREAM_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                # evicted for falling behind, the client reconnects and replays
+                if change is None:
+                    yield "event: evicted\ndata: {}\n\n"
+                    break
+
+                if change["cursor"] > cursor:
+                    cursor = change["cursor"]
+                    yield format_event(change)
+        finally:
+            change_stream.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("", status_code=status.HTTP_200_OK)
+def get_changes(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    engine = get_engine()
+
+    with Session(engine) as session:
+        check_cursor(session, since)
+
+        changes = read_changes(session, since, limit + 1)
+
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        return {
+            "changes": changes,
+            "cursor": changes[-1]["cursor"] if changes else since,
+            "has_more": has_more,
+        }
@@ -1,43 +1,54 @@
-from fastapi import APIRouter, HTTPException, Request, status
-from sqlalchemy import create_engine
-from sqlmodel import Session, select
+from datetime import date
+from itertools import chain
+from typing import Optional
 
-from db import db_url
-from db.models import company
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import and_
+from sqlalchemy.orm import load_only
+from sqlmodel import Session, delete, func, select
+
+from db.archive import roles_since
+from db.changes import CREATE, UPDATE, record_change, record_delete
 from db.models.company import Company, CompanyDTO, CompanyValidator
+from db.models.company_stats import CompanyStats
 from db.models.department import Department
 from db.models.employee import Employee
-from db.models.role import Role
+from db.models.role import RoleHistory
+from db.queries import (
+    company_by_id,
+    company_by_registration_number,
+    company_department_exists,
+    company_role_exists,
+    role_active_on,
+)
+from db.resolver import bump_names_version, name_resolver
+from db.rows import fetch_dicts
+from db.shards import (
+    company_shard,
+    fan_out,
+    home_shard,
+    other_shards,
+    shard_coalescer,
+    shard_engine,
+    sharded,
+)
+from db.stats import average_tenure_days, delete_company_stats, refresh_company_stats
+from utils.admission import admission_control
+from utils.fields import model_columns, parse_fields, prune
+from utils.uuid_generator import uuid_generator
 
 router = APIRouter(
     prefix="/company",
     tags=["company"],
+    dependencies=[Depends(admission_control)],
 )
 
-
-def query_company_by_reg_num(reg_number: str) -> Company:
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statememt = select(Company).where(Company.registration_number == reg_number)
-        company = session.exec(statememt).one_or_none()
-        return company
-
-
-def query_company_by_name(name: str) -> Company:
-    """
-    Check if company name exists in the database
-    """
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statememt = select(Company).where(Company.name == name)
-        company = session.exec(statememt).one_or_none()
-        return company
+# max number of employee ids per query when looking across shards
+EMPLOYEE_CHUNK_SIZE = 10000
 
 
 @router.post("", status_code=status.HTTP_201_CREATED)
-async def create_company(company_dto: CompanyDTO):
+def create_company(company_dto: CompanyDTO):
     # validate company details
 
     errors = CompanyValidator().validate(
@@ -48,10 +59,11 @@ async def create_company(company_dto: CompanyDTO):
     )
 
     # check if reg number, company name is unique
-    if query_company_by_name(company_dto.name) is not None:
+    if name_resolver.names().company_id(company_dto.name) is not None:
         errors["name"] = ["Company name already exists"]
 
-    if query_company_by_reg_num(company_dto.registration_number) is not None:
+    statement = company_by_registration_number(company_dto.registration_number)
+    if any(fan_out(lambda session: session.scalars(statement).one_or_none())):
         errors["registration_number"] = ["Registration number already exists"]
 
     # return errors if any
@@ -59,19 +71,24 @@ async def create_company(company_dto: CompanyDTO):
         raise HTTPException(status_code=400, detail=errors)
 
     # save to db
-    engine = create_engine(db_url)
     company = Company(**company_dto.model_dump())
+    # the id picks the shard of the company, so it is needed up front
+    company.id = company.id or uuid_generator()
 
-    with Session(engine) as session:
+    def save(session: Session) -> dict:
         session.add(company)
-        session.commit()
+        bump_names_version(session)
+        session.flush()
         session.refresh(company)
+        record_change(session, CREATE, company)
 
-    return company.model_dump()
+        return company.model_dump()
+
+    return shard_coalescer(home_shard(company.id)).run(save)
 
 
 @router.put("/{company_id}", status_code=status.HTTP_200_OK)
-async def update_company(company_id: str, company_dto: CompanyDTO):
+def update_company(company_id: str, company_dto: CompanyDTO):
     # validate company details
     errors = CompanyValidator().validate(
         {
@@ -81,24 +98,22 @@ async def update_company(company_id: str, company_dto: CompanyDTO):
     )
 
     # check if company name and reg number belongs to the current company
-    company = query_company_by_name(company_dto.name)
-    if company is not None and company.id != company_id:
+    existing_id = name_resolver.names().company_id(company_dto.name)
+    if existing_id is not None and existing_id != company_id:
         errors["name"] = ["Company name already exists"]
 
-    company = query_company_by_reg_num(company_dto.registration_number)
-    if company is not None and company.id != company_id:
-        errors["registration_number"] = ["Registration number already exists"]
+    statement = company_by_registration_number(company_dto.registration_number)
+    for company in fan_out(lambda session: session.scalars(statement).one_or_none()):
+        if company is not None and company.id != company_id:
+            errors["registration_number"] = ["Registration number already exists"]
 
     # return errors if any
     if errors:
         raise HTTPException(status_code=400, detail=errors)
 
     # save to db
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statement = select(Company).where(Company.id == company_id)
-        company = session.exec(statement).one_or_none()
+    def save(session: Session) -> dict:
+        company = session.scalars(company_by_id(company_id)).one_or_none()
 
         if company is None:
             raise HTTPException(status_code=404, detail="Company not found")
@@ -108,68 +123,69 @@ async def update_company(company_id: str, company_dto: CompanyDTO):
                 setattr(company, key, value)
 
         session.add(company)
-        session.commit()
+        bump_names_version(session)
+        session.flush()
         session.refresh(company)
+        record_change(session, UPDATE, company)
 
-    return company.model_dump()
+        return company.model_dump()
 
+    return shard_coalescer(company_shard(company_id)).run(save)
 
-@router.delete("/{company_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_company(company_id: str):
-    engine = create_engine(db_url)
 
-    # check if there are roles or departments associated with the company
-    with Session(engine) as session:
-        statement = select(Role).where(Role.company_id == company_id)
-        roles = session.exec(statement).all()
-
-        if roles:
+@router.delete("/{company_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_company(company_id: str):
+    def save(session: Session):
+        # check if there are roles or departments associated with the company
+        if session.scalars(company_role_exists(company_id)).first() is not None:
             raise HTTPException(
                 status_code=400,
                 detail="Company has roles associated with it. Cannot delete",
             )
 
-        statement = select(Department).where(Department.company_id == company_id)
-        departments = session.exec(statement).all()
-
-        if departments:
+        statement = company_department_exists(company_id)
+        if session.scalars(statement).first() is not None:
             raise HTTPException(
                 status_code=400,
                 detail="Company has departments associated with it. Cannot delete",
             )
 
-    # delete company
-    with Session(engine) as session:
-        statement = select(Company).where(Company.id == company_id)
-        company = session.exec(statement).one_or_none()
+        # delete company
+        result = session.execute(delete(Company).where(Company.id == company_id))
 
-        if company is None:
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Company not found")
 
-        session.delete(company)
-        session.commit()
+        bump_names_version(session)
+        delete_company_stats(session, company_id)
+        record_delete(session, "company", company_id, company_id)
+
+    shard_coalescer(company_shard(company_id)).run(save)
 
     return None
 
 
 @router.get("", status_code=status.HTTP_200_OK)
-async def get_companies():
-    # paginate
-    engine = create_engine(db_url)
+def get_companies(fields: Optional[str] = None):
+    tree = parse_fields(fields)
 
-    with Session(engine) as session:
-        statement = select(Company)
-        companies = session.exec(statement).all()
+    # paginate
+    statement = select(*model_columns(Company, tree))
 
-        return [company.model_dump() for company in companies]
+    return list(chain(*fan_out(lambda session: fetch_dicts(session, statement))))
 
 
 @router.get("/{company_id}", status_code=status.HTTP_200_OK)
-async def get_company_by_id(company_id: str):
-    engine = create_engine(db_url)
+def get_company_by_id(company_id: str, fields: Optional[str] = None):
+    tree = parse_fields(fields)
+    engine = shard_engine(company_shard(company_id))
 
     with Session(engine) as session:
-        statememt = select(Company).where(Company.id == company_id)
+        statememt = (
+            select(Company)
+            .where(Company.id == company_id)
+            .options(load_only(*model_columns(Company, tree)))
+        )
         company = session.exec(statememt).one_or_none()
 
         # get number of employees as well
@@ -181,39 +197,160 @@ async def get_company_by_id(company_id: str):
 
 
 @router.get("/{company_id}/employees", status_code=status.HTTP_200_OK)
-async def get_company_employees(company_id: str):
-    engine = create_engine(db_url)
+def get_company_employees(company_id: str, fields: Optional[str] = None):
+    tree = parse_fields(fields)
+    shard = company_shard(company_id)
+    engine = shard_engine(shard)
 
     with Session(engine) as session:
-        # get all employees who've worked at company x
-        statement = select(Role).where(Role.company_id == company_id)
-        roles = session.exec(statement).all()
-        employees = [role.employee for role in roles]
+        # start date of the last role of everyone who's worked at company x
+        latest_roles = (
+            select(
+                RoleHistory.employee_id,
+                func.max(RoleHistory.start_date).label("start_date"),
+            )
+            .where(
+                RoleHistory.employee_id.in_(
+                    select(RoleHistory.employee_id).where(
+                        RoleHistory.company_id == company_id
+                    )
+                )
+            )
+            .group_by(RoleHistory.employee_id)
+            .subquery()
+        )
 
         # get employees who's last role was at company x
-        current_employees = []
-        current_employee_ids = []
+        statement = (
+            select(*model_columns(Employee, tree))
+            .join(latest_roles, latest_roles.c.employee_id == Employee.id)
+            .join(
+                RoleHistory,
+                and_(
+                    RoleHistory.employee_id == Employee.id,
+                    RoleHistory.start_date == latest_roles.c.start_date,
+                ),
+            )
+            .where(RoleHistory.company_id == company_id)
+            .distinct()
+        )
+
+        if sharded():
+            # compared with the roles on the other shards below
+            statement = statement.add_columns(
+                latest_roles.c.start_date.label("latest_start_date")
+            )
 
-        for employee in employees:
-            if not employee:
-                continue
+        employees = fetch_dicts(session, statement)
+
+    if not sharded():
+        return employees
+
+    # drop employees whose last role is at a company on another shard
+    latest_start_dates = {
+        employee["id"]: employee.pop("latest_start_date") for employee in employees
+    }
+    employee_ids = list(latest_start_dates)
+
+    def latest_elsewhere(session: Session) -> dict:
+        start_dates = {}
+
+        for i in range(0, len(employee_ids), EMPLOYEE_CHUNK_SIZE):
+            statement = (
+                select(RoleHistory.employee_id, func.max(RoleHistory.start_date))
+                .where(
+                    RoleHistory.employee_id.in_(
+                        employee_ids[i : i + EMPLOYEE_CHUNK_SIZE]
+                    )
+                )
+                .group_by(RoleHistory.employee_id)
+            )
+            start_dates.update(session.exec(statement).all())
+
+        return start_dates
+
+    moved_on = {
+        employee_id
+        for start_dates in fan_out(latest_elsewhere, on=other_shards(shard))
+        for employee_id, start_date in start_dates.items()
+        if start_date > latest_start_dates[employee_id]
+    }
+
+    return [employee for employee in employees if employee["id"] not in moved_on]
 
-            employee.roles.sort(key=lambda x: x.start_date, reverse=True)
 
-            if employee.roles[0].company_id == company_id:
-                if employee.id not in current_employee_ids:
-                    current_employee_ids.append(employee.id)
-                    current_employees.append(employee)
+@router.get("/{company_id}/headcount", status_code=status.HTTP_200_OK)
+def get_company_headcount(
+    company_id: str,
+    day: Optional[date] = Query(default=None, alias="date"),
+    fields: Optional[str] = None,
+):
+    tree = parse_fields(fields)
+    day = day or date.today()
+    engine = shard_engine(company_shard(company_id))
+
+    with Session(engine) as session:
+        # number of people holding a role at company x on the given day
+        role_model = roles_since(day)
+        statement = select(func.count(role_model.employee_id.distinct())).where(
+            role_model.company_id == company_id, role_active_on(day, role_model)
+        )
+        headcount = session.exec(statement).one()
+
+        return prune(
+            {"company_id": company_id, "date": day, "headcount": headcount}, tree
+        )
 
-        return [employee.model_dump() for employee in current_employees]
+
+@router.get("/{company_id}/stats", status_code=status.HTTP_200_OK)
+def get_company_stats(company_id: str, fields: Optional[str] = None):
+    tree = parse_fields(fields)
+    engine = shard_engine(company_shard(company_id))
+
+    with Session(engine) as session:
+        company_stats = session.get(CompanyStats, company_id)
+
+        if company_stats is None and session.get(Company, company_id) is None:
+            raise HTTPException(status_code=404, detail="Company not found")
+
+        company_stats = company_stats.model_dump() if company_stats else None
+
+    # stats are kept up to date by role writes, build them if missing. written
+    # through the primary as this may run on the read snapshot
+    if company_stats is None:
+
+        def save(session: Session) -> dict:
+            refresh_company_stats(session, [company_id])
+            session.flush()
+            return session.get(CompanyStats, company_id).model_dump()
+
+        company_stats = shard_coalescer(company_shard(company_id)).run(save)
+
+    stats = company_stats["stats"]
+
+    return prune(
+        {
+            "company_id": company_id,
+            "headcount_by_department": stats["headcount_by_department"],
+            "current_employees": stats["current_employees"],
+            "former_employees": stats["former_employees"],
+            "average_tenure_days": average_tenure_days(stats, date.today()),
+            "hires_by_year": stats["hires_by_year"],
+            "leavers_by_year": stats["leavers_by_year"],
+            "updated_at": company_stats["updated_at"],
+        },
+        tree,
+    )
 
 
 @router.get("/{company_id}/departments", status_code=status.HTTP_200_OK)
-async def get_company_departments(company_id: str):
-    engine = create_engine(db_url)
+def get_company_departments(company_id: str, fields: Optional[str] = None):
+    tree = parse_fields(fields)
+    engine = shard_engine(company_shard(company_id))
 
     with Session(engine) as session:
-        statement = select(Department).where(Department.company_id == company_id)
-        departments = session.exec(statement).all()
+        statement = select(*model_columns(Department, tree)).where(
+            Department.company_id == company_id
+        )
 
-        return [department.model_dump() for department in departments]
+        return fetch_dicts(session, statement)
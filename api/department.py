@@ -1,49 +1,39 @@
-from fastapi import APIRouter, HTTPException, Request, status
-from sqlalchemy import create_engine
-from sqlmodel import Session, select
+from typing import Optional
 
-from db import db_url
-from db.models.company import Company, CompanyDTO, CompanyValidator
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import load_only
+from sqlmodel import Session, delete, select
+
+from db.changes import CREATE, UPDATE, record_change, record_delete
 from db.models.department import Department, DepartmentDTO, DepartmentValidator
 from db.models.employee import Employee
 from db.models.role import Role
+from db.queries import department_by_id, department_company_id, department_role_exists
+from db.resolver import bump_names_version, name_resolver
+from db.rows import fetch_dicts
+from db.shards import department_shard, shard_coalescer, shard_engine
+from db.stats import rename_department_in_stats
+from utils.admission import admission_control
+from utils.fields import model_columns, parse_fields
 
 router = APIRouter(
     prefix="/department",
     tags=["department"],
+    dependencies=[Depends(admission_control)],
 )
 
 
-def query_company_by_id(id: str) -> bool:
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statememt = select(Company).where(Company.id == id)
-        company = session.exec(statememt).one_or_none()
-        return company
-
-
-def query_department_by_name(company_id, name: str) -> bool:
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statememt = select(Department).where(
-            Department.name == name, Department.company_id == company_id
-        )
-        department = session.exec(statememt).one_or_none()
-        return department
-
-
 @router.post("", status_code=status.HTTP_201_CREATED)
-async def create_department(department_dto: DepartmentDTO):
+def create_department(department_dto: DepartmentDTO):
     # validate department details
     errors = DepartmentValidator().validate(department_dto.model_dump())
 
     # check if company exists and if department exists for the particular company
-    if query_department_by_name(department_dto.company_id, department_dto.name):
+    names = name_resolver.names()
+    if names.department_id(department_dto.company_id, department_dto.name):
         errors["name"] = ["Department name already exists"]
 
-    if query_company_by_id(department_dto.company_id) is None:
+    if not names.has_company(department_dto.company_id):
         errors["name"] = ["Company does not exist"]
 
     # return errors if any
@@ -51,27 +41,29 @@ async def create_department(department_dto: DepartmentDTO):
         raise HTTPException(status_code=400, detail=errors)
 
     # save to db
-    engine = create_engine(db_url)
     department = Department(**department_dto.model_dump())
 
-    with Session(engine) as session:
+    def save(session: Session) -> dict:
         session.add(department)
-        session.commit()
+        bump_names_version(session)
+        session.flush()
         session.refresh(department)
+        record_change(session, CREATE, department)
 
-    return department.model_dump()
+        return department.model_dump()
+
+    return shard_coalescer(names.shard(department_dto.company_id)).run(save)
 
 
 @router.put("/{department_id}", status_code=status.HTTP_200_OK)
-async def update_departmernt(department_id: str, department_dto: DepartmentDTO):
+def update_departmernt(department_id: str, department_dto: DepartmentDTO):
     # validate department details
     errors = DepartmentValidator().validate(department_dto.model_dump())
 
     # check if department name belongs to the current company
-    department = query_department_by_name(
-        department_dto.company_id, department_dto.name
-    )
-    if department is not None and department.id != department_id:
+    names = name_resolver.names()
+    existing_id = names.department_id(department_dto.company_id, department_dto.name)
+    if existing_id is not None and existing_id != department_id:
         errors["name"] = ["Department name already exists"]
 
     # return errors if any
@@ -79,11 +71,8 @@ async def update_departmernt(department_id: str, department_dto: DepartmentDTO):
         raise HTTPException(status_code=400, detail=errors)
 
     # save to db
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statement = select(Department).where(Department.id == department_id)
-        department = session.exec(statement).one_or_none()
+    def save(session: Session) -> dict:
+        department = session.scalars(department_by_id(department_id)).one_or_none()
 
         if department is None:
             raise HTTPException(status_code=404, detail="Department not found")
@@ -93,47 +82,59 @@ async def update_departmernt(department_id: str, department_dto: DepartmentDTO):
                 setattr(department, key, value)
 
         session.add(department)
-        session.commit()
-        session.refresh(department)
+        bump_names_version(session)
 
-    return department.model_dump()
+        # department names are part of the company stats
+        rename_department_in_stats(
+            session, department.company_id, department.id, department.name
+        )
+        session.flush()
+        session.refresh(department)
+        record_change(session, UPDATE, department)
 
+        return department.model_dump()
 
-@router.delete("/{department_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_department(department_id: str):
-    engine = create_engine(db_url)
+    return shard_coalescer(names.department_shard(department_id)).run(save)
 
-    # check if there are roles associated with the department
-    with Session(engine) as session:
-        statement = select(Role).where(Role.department_id == department_id)
-        roles = session.exec(statement).all()
 
-        if roles:
+@router.delete("/{department_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_department(department_id: str):
+    def save(session: Session):
+        # check if there are roles associated with the department
+        statement = department_role_exists(department_id)
+        if session.scalars(statement).first() is not None:
             raise HTTPException(
                 status_code=400,
                 detail="Department has roles associated with it. Cannot delete",
             )
 
-    # delete department
-    with Session(engine) as session:
-        statement = select(Department).where(Department.id == department_id)
-        department = session.exec(statement).one_or_none()
+        # delete department
+        statement = department_company_id(department_id)
+        company_id = session.scalars(statement).one_or_none()
 
-        if department is None:
+        if company_id is None:
             raise HTTPException(status_code=404, detail="Department not found")
 
-        session.delete(department)
-        session.commit()
+        session.execute(delete(Department).where(Department.id == department_id))
+        bump_names_version(session)
+        record_delete(session, "department", department_id, company_id)
+
+    shard_coalescer(department_shard(department_id)).run(save)
 
     return None
 
 
 @router.get("/{department_id}", status_code=status.HTTP_200_OK)
-async def get_department_by_id(department_id: str):
-    engine = create_engine(db_url)
+def get_department_by_id(department_id: str, fields: Optional[str] = None):
+    tree = parse_fields(fields)
+    engine = shard_engine(department_shard(department_id))
 
     with Session(engine) as session:
-        statement = select(Department).where(Department.id == department_id)
+        statement = (
+            select(Department)
+            .where(Department.id == department_id)
+            .options(load_only(*model_columns(Department, tree)))
+        )
         department = session.exec(statement).one_or_none()
 
         if department is None:
@@ -143,16 +144,17 @@ async def get_department_by_id(department_id: str):
 
 
 @router.get("/{department_id}/employees", status_code=status.HTTP_200_OK)
-async def get_department_employees(department_id: str):
-    engine = create_engine(db_url)
+def get_department_employees(department_id: str, fields: Optional[str] = None):
+    tree = parse_fields(fields)
+    engine = shard_engine(department_shard(department_id))
 
     with Session(engine) as session:
-        statement = select(Role).where(Role.department_id == department_id)
-        roles = session.exec(statement).all()
-
-        employees = []
-        for role in roles:
-            if role.end_date is None:
-                employees.append(role.employee)
+        # employees with an ongoing role in the department
+        statement = (
+            select(*model_columns(Employee, tree))
+            .join(Role, Role.employee_id == Employee.id)
+            .where(Role.department_id == department_id, Role.end_date.is_(None))
+            .distinct()
+        )
 
-        return employees
+        return fetch_dicts(session, statement)
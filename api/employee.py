@@ -1,62 +1,156 @@
 from datetime import date
-from typing import Optional
-
-import pydantic
-from fastapi import APIRouter, HTTPException, Request, status
-from marshmallow import EXCLUDE, Schema, fields, validate
-from pydantic import BaseModel
-from sqlalchemy import create_engine
-from sqlmodel import Session, select
-
-from db import db_url
-from db.models.company import Company, CompanyDTO, CompanyValidator
-from db.models.department import Department, DepartmentDTO, DepartmentValidator
+from itertools import chain
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import load_only
+from sqlmodel import Session, delete, select
+
+import config
+from db import get_engine
+from db.changes import CREATE, UPDATE, record_change, record_delete
+from db.coalescer import write_coalescer
+from db.duplicates import (
+    delete_blocking_keys,
+    find_duplicates,
+    refresh_blocking_keys,
+)
+from db.models.company import Company
+from db.models.department import Department
 from db.models.employee import (
     Employee,
+    EmployeeBatchDTO,
+    EmployeeBulkDeleteDTO,
     EmployeeDTO,
     EmployeeValidator,
     NewEmployeeDTO,
     NewEmployeeValidator,
 )
-from db.models.role import Role
+from db.models.role import Role, RoleArchive, RoleHistory
+from db.queries import employee_by_id, role_active_on, role_overlaps
+from db.resolver import name_resolver
+from db.rows import fetch_dicts
+from db.shards import fan_out, shard_coalescer, sharded, shards, write_shards
+from db.stats import company_stats_delta
+from utils.admission import admission_control
+from utils.fields import model_columns, parse_fields, prune
 
 router = APIRouter(
     prefix="/employee",
     tags=["employee"],
+    dependencies=[Depends(admission_control)],
 )
 
+# max number of employees deleted per transaction in bulk deletes
+BULK_DELETE_CHUNK_SIZE = 500
 
-def query_company_by_id(id: str) -> bool:
-    engine = create_engine(db_url)
+# max number of employees fetched in one batch request
+BATCH_FETCH_MAX_SIZE = 1000
 
-    with Session(engine) as session:
-        statememt = select(Company).where(Company.id == id)
-        company = session.exec(statememt).one_or_none()
-        return company
+# response formats, normalized returns each company and department once
+NESTED = "nested"
+NORMALIZED = "normalized"
+ResponseFormat = Literal["nested", "normalized"]
 
 
-def query_department_by_name(company_id, name: str) -> bool:
-    engine = create_engine(db_url)
+def delete_roles(session: Session, employee_ids: list):
+    """
+    Delete all roles of employees, archived ones included
+    :param session: session of the write
+    :param employee_ids: ids of the employees
+    """
 
-    with Session(engine) as session:
-        statememt = select(Department).where(
-            Department.name == name, Department.company_id == company_id
+    statement = select(
+        RoleHistory.id, RoleHistory.company_id, RoleHistory.employee_id
+    ).where(RoleHistory.employee_id.in_(employee_ids))
+    roles = session.exec(statement).all()
+
+    employees = [(company_id, employee_id) for _, company_id, employee_id in roles]
+
+    with company_stats_delta(session, employees):
+        session.execute(delete(Role).where(Role.employee_id.in_(employee_ids)))
+        statement = delete(RoleArchive).where(RoleArchive.employee_id.in_(employee_ids))
+        session.execute(statement)
+
+    for role_id, company_id, _ in roles:
+        record_delete(session, "role", role_id, company_id)
+
+
+def employee_company_ids(employee_ids: list) -> dict:
+    """
+    Find the companies employees have roles at, archived roles included, for
+    the change log
+    :param employee_ids: employee ids
+    :return: sorted company ids by employee id
+    """
+
+    statement = (
+        select(RoleHistory.employee_id, RoleHistory.company_id)
+        .where(RoleHistory.employee_id.in_(employee_ids))
+        .distinct()
+    )
+    company_ids = {employee_id: set() for employee_id in employee_ids}
+
+    for employee_id, company_id in chain(
+        *fan_out(lambda session: session.exec(statement).all())
+    ):
+        company_ids[employee_id].add(company_id)
+
+    return {employee_id: sorted(ids) for employee_id, ids in company_ids.items()}
+
+
+def delete_shard_roles(employee_ids: list):
+    """
+    Delete all roles of employees on every shard, a transaction per shard.
+    Call before deleting the employees, does nothing when sharding is off as
+    delete_employees_by_id deletes the roles with the employees.
+    :param employee_ids: ids of the employees
+    """
+
+    if sharded():
+        write_shards(
+            {
+                shard: lambda session: delete_roles(session, employee_ids)
+                for shard in shards()
+            }
         )
-        department = session.exec(statememt).one_or_none()
-        return department
 
 
-def query_employee_by_id(id: str) -> bool:
-    engine = create_engine(db_url)
+def delete_employees_by_id(
+    session: Session, employee_ids: list, company_ids: Optional[dict] = None
+) -> int:
+    """
+    Delete employees together with all their roles, with sharding their roles
+    are deleted by delete_shard_roles beforehand
+    :param session: session of the write
+    :param employee_ids: ids of the employees to delete
+    :param company_ids: companies the employees had roles at, from
+    employee_company_ids before their roles were deleted
+    :return: number of deleted employees
+    """
+
+    statement = select(Employee.id).where(Employee.id.in_(employee_ids))
+    deleted_ids = session.exec(statement).all()
+
+    if not sharded():
+        delete_roles(session, employee_ids)
+
+    delete_blocking_keys(session, employee_ids)
+    session.execute(delete(Employee).where(Employee.id.in_(employee_ids)))
+
+    for employee_id in deleted_ids:
+        record_delete(
+            session,
+            "employee",
+            employee_id,
+            company_ids=(company_ids or {}).get(employee_id),
+        )
 
-    with Session(engine) as session:
-        statememt = select(Employee).where(Employee.id == id)
-        employee = session.exec(statememt).one_or_none()
-        return employee
+    return len(deleted_ids)
 
 
 @router.post("", status_code=status.HTTP_201_CREATED)
-async def create_employee(employee_dto: NewEmployeeDTO):
+def create_employee(employee_dto: NewEmployeeDTO):
     # validate department details
     errors = NewEmployeeValidator().validate(
         {
@@ -69,15 +163,15 @@ async def create_employee(employee_dto: NewEmployeeDTO):
     )
 
     # check if company exists
-    company = query_company_by_id(employee_dto.company_id)
-    if company is None:
+    names = name_resolver.names()
+    if not names.has_company(employee_dto.company_id):
         errors["company_id"] = ["Company does not exist"]
 
     # check if department exists for the particular company
-    department = query_department_by_name(
+    department_id = names.department_id(
         employee_dto.company_id, employee_dto.department_name
     )
-    if department is None:
+    if department_id is None:
         errors["department_name"] = ["Department does not exist for the company"]
 
     # return errors if any
@@ -85,27 +179,59 @@ async def create_employee(employee_dto: NewEmployeeDTO):
         raise HTTPException(status_code=400, detail=errors)
 
     # save to db
-    engine = create_engine(db_url)
     employee = Employee(**employee_dto.model_dump(), name=employee_dto.employee_name)
     role = Role(
         **employee_dto.model_dump(),
         name=employee_dto.role_name,
         employee_id=employee.id,
-        department_id=department.id,
+        department_id=department_id,
     )
 
-    with Session(engine) as session:
+    def save_employee(session: Session) -> dict:
         session.add(employee)
-        session.add(role)
-        session.commit()
+        session.flush()
         session.refresh(employee)
+        record_change(session, CREATE, employee, [role.company_id])
+
+        return employee.model_dump()
+
+    def save_role(session: Session):
+        with company_stats_delta(session, [(role.company_id, role.employee_id)]):
+            session.add(role)
+
+        session.flush()
         session.refresh(role)
+        refresh_blocking_keys(session, [role.employee_id])
+        record_change(session, CREATE, role)
+
+    if not sharded():
+
+        def save(session: Session) -> dict:
+            data = save_employee(session)
+            save_role(session)
 
-    return employee.model_dump()
+            return data
+
+        return write_coalescer.run(save)
+
+    # the employee goes to the main database and the role to the shard of its
+    # company, the employee is taken out again if the role cannot be saved
+    data = write_coalescer.run(save_employee)
+
+    try:
+        shard_coalescer(names.shard(role.company_id)).run(save_role)
+    except Exception:
+        write_coalescer.run(
+            lambda session: delete_employees_by_id(session, [data["id"]]),
+            admit=False,
+        )
+        raise
+
+    return data
 
 
 @router.put("/{employee_id}", status_code=status.HTTP_200_OK)
-async def update_employee(employee_id: str, employee_dto: EmployeeDTO):
+def update_employee(employee_id: str, employee_dto: EmployeeDTO):
     # validate employee details
     errors = EmployeeValidator().validate(employee_dto.model_dump())
 
@@ -113,120 +239,416 @@ async def update_employee(employee_id: str, employee_dto: EmployeeDTO):
     if errors:
         raise HTTPException(status_code=400, detail=errors)
 
-    # save to db
-    engine = create_engine(db_url)
+    # read before the write, roles may be on other shards
+    company_ids = employee_company_ids([employee_id])
 
-    with Session(engine) as session:
-        statement = select(Employee).where(Employee.id == employee_id)
-        employee = session.exec(statement).one_or_none()
+    # save to db
+    def save(session: Session) -> dict:
+        employee = session.scalars(employee_by_id(employee_id)).one_or_none()
 
         if employee is None:
             raise HTTPException(status_code=404, detail="Employee not found")
 
         employee.name = employee_dto.employee_name
         session.add(employee)
-        session.commit()
+        session.flush()
         session.refresh(employee)
+        refresh_blocking_keys(session, [employee.id])
+        record_change(session, UPDATE, employee, company_ids[employee_id])
 
-    return employee.model_dump()
+        return employee.model_dump()
 
+    return write_coalescer.run(save)
 
-@router.delete("/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_employee(employee_id: str):
-    engine = create_engine(db_url)
 
-    with Session(engine) as session:
-        statement = select(Employee).where(Employee.id == employee_id)
-        employee = session.exec(statement).one_or_none()
+@router.delete("", status_code=status.HTTP_200_OK)
+def delete_employees(employee_dto: EmployeeBulkDeleteDTO):
+    employee_ids = list(dict.fromkeys(employee_dto.ids))
+    deleted = 0
 
-        if employee is None:
+    # delete in chunks so the write lock is released between transactions
+    for i in range(0, len(employee_ids), BULK_DELETE_CHUNK_SIZE):
+        chunk = employee_ids[i : i + BULK_DELETE_CHUNK_SIZE]
+
+        company_ids = employee_company_ids(chunk)
+
+        def save(
+            session: Session, chunk: list = chunk, company_ids: dict = company_ids
+        ) -> int:
+            return delete_employees_by_id(session, chunk, company_ids)
+
+        delete_shard_roles(chunk)
+        deleted += write_coalescer.run(save)
+
+    return {"deleted": deleted}
+
+
+@router.delete("/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_employee(employee_id: str):
+    company_ids = employee_company_ids([employee_id])
+
+    def save(session: Session):
+        if delete_employees_by_id(session, [employee_id], company_ids) == 0:
             raise HTTPException(status_code=404, detail="Employee not found")
 
-        for role in employee.roles:
-            session.delete(role)
-        session.delete(employee)
-        session.commit()
+    delete_shard_roles([employee_id])
+    write_coalescer.run(save)
 
     return
 
 
+def load_employees(
+    session: Session, employee_ids: list, tree: dict, normalized: bool = False
+):
+    """
+    Load employees with their roles and the departments and companies of those
+    roles, in a fixed number of queries however many employees are requested
+    :param session: database session
+    :param employee_ids: ids of the employees to load
+    :param tree: field tree, empty for all fields
+    :param normalized: return each company and department once, referenced by id
+    :return: employees in the order of the ids, unknown ids are left out
+    """
+
+    statement = (
+        select(Employee)
+        .where(Employee.id.in_(employee_ids))
+        .options(load_only(*model_columns(Employee, tree, nested=("roles",))))
+    )
+    employees = {employee.id: employee for employee in session.exec(statement).all()}
+    employee_ids = [
+        employee_id for employee_id in employee_ids if employee_id in employees
+    ]
+
+    if tree and "roles" not in tree:
+        employees = [
+            employees[employee_id].model_dump() for employee_id in employee_ids
+        ]
+
+        return {"employees": employees} if normalized else employees
+
+    # roles with their department and company, archived ones included
+    role_tree = tree.get("roles")
+    role_columns = model_columns(
+        RoleHistory, role_tree, nested=("department", "company")
+    )
+
+    def load_roles(session: Session) -> tuple:
+        statement = (
+            select(RoleHistory)
+            .where(RoleHistory.employee_id.in_(employees))
+            .order_by(RoleHistory.employee_id, RoleHistory.start_date.desc())
+            .options(
+                load_only(
+                    *role_columns,
+                    RoleHistory.employee_id,
+                    RoleHistory.company_id,
+                    RoleHistory.department_id,
+                    RoleHistory.start_date,
+                )
+            )
+        )
+        roles = session.exec(statement).all()
+
+        departments = {}
+        if not role_tree or "department" in role_tree:
+            department_tree = (role_tree or {}).get("department")
+            statement = (
+                select(Department)
+                .where(Department.id.in_({role.department_id for role in roles}))
+                .options(load_only(*model_columns(Department, department_tree)))
+            )
+            departments = {
+                department.id: department.model_dump()
+                for department in session.exec(statement).all()
+            }
+
+        companies = {}
+        if not role_tree or "company" in role_tree:
+            company_tree = (role_tree or {}).get("company")
+            statement = (
+                select(Company)
+                .where(Company.id.in_({role.company_id for role in roles}))
+                .options(load_only(*model_columns(Company, company_tree)))
+            )
+            companies = {
+                company.id: company.model_dump()
+                for company in session.exec(statement).all()
+            }
+
+        return roles, departments, companies
+
+    # roles are spread over the shards, departments and companies are on the
+    # shard of their roles
+    roles, departments, companies = [], {}, {}
+
+    for shard_roles, shard_departments, shard_companies in fan_out(load_roles, session):
+        roles += shard_roles
+        departments.update(shard_departments)
+        companies.update(shard_companies)
+
+    # same order as a single query, newest role of each employee first
+    if sharded():
+        roles.sort(key=lambda role: role.start_date, reverse=True)
+        roles.sort(key=lambda role: role.employee_id)
+
+    if normalized:
+        return normalize(
+            [employees[employee_id] for employee_id in employee_ids],
+            roles,
+            departments,
+            companies,
+            tree,
+        )
+
+    employee_roles = {employee_id: [] for employee_id in employee_ids}
+    for role in roles:
+        employee_roles[role.employee_id].append(role)
+
+    return prune(
+        [
+            {
+                **employees[employee_id].model_dump(),
+                "roles": [
+                    {
+                        **role.model_dump(),
+                        "department": departments.get(role.department_id),
+                        "company": companies.get(role.company_id),
+                    }
+                    for role in employee_roles[employee_id]
+                ],
+            }
+            for employee_id in employee_ids
+        ],
+        tree,
+    )
+
+
+def normalize(
+    employees: list, roles: list, departments: dict, companies: dict, tree: dict
+) -> dict:
+    """
+    Build a compound document where employees list the ids of their roles and
+    roles reference their department and company by id
+    :param employees: employees in response order
+    :param roles: roles of the employees
+    :param departments: departments by id
+    :param companies: companies by id
+    :param tree: field tree, empty for all fields
+    :return: employees, roles, departments and companies
+    """
+
+    role_tree = tree.get("roles")
+    department_tree = (role_tree or {}).get("department")
+    company_tree = (role_tree or {}).get("company")
+
+    role_ids = {employee.id: [] for employee in employees}
+    role_data = {}
+
+    for role in roles:
+        role_ids[role.employee_id].append(role.id)
+        data = prune(role.model_dump(), role_tree)
+
+        # references are kept whenever the referenced objects are returned
+        if role.department_id in departments:
+            data["department_id"] = role.department_id
+        if role.company_id in companies:
+            data["company_id"] = role.company_id
+
+        role_data[role.id] = data
+
+    employee_tree = None
+    if tree:
+        employee_tree = {key: {} for key in tree if key != "roles"} or {"id": {}}
+
+    return {
+        "employees": [
+            {
+                **prune(employee.model_dump(), employee_tree),
+                "roles": role_ids[employee.id],
+            }
+            for employee in employees
+        ],
+        "roles": role_data,
+        "departments": {
+            department_id: prune(department, department_tree)
+            for department_id, department in departments.items()
+        },
+        "companies": {
+            company_id: prune(company, company_tree)
+            for company_id, company in companies.items()
+        },
+    }
+
+
+def get_employees_by_id(employee_ids: list, fields: Optional[str], normalized: bool):
+    tree = parse_fields(fields) or {}
+
+    # keep the requested order, without duplicates
+    employee_ids = list(dict.fromkeys(employee_ids))
+
+    if len(employee_ids) > BATCH_FETCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "ids": [f"At most {BATCH_FETCH_MAX_SIZE} employees can be fetched"]
+            },
+        )
+
+    engine = get_engine()
+
+    with Session(engine) as session:
+        return load_employees(session, employee_ids, tree, normalized)
+
+
+@router.get("/batch", status_code=status.HTTP_200_OK)
+def get_employees_batch(
+    ids: list[str] = Query(default=[]),
+    fields: Optional[str] = None,
+    response_format: ResponseFormat = Query(default=NESTED, alias="format"),
+):
+    # accept both ?ids=a&ids=b and ?ids=a,b
+    employee_ids = [
+        employee_id.strip()
+        for value in ids
+        for employee_id in value.split(",")
+        if employee_id.strip()
+    ]
+
+    return get_employees_by_id(employee_ids, fields, response_format == NORMALIZED)
+
+
+@router.post("/batch", status_code=status.HTTP_200_OK)
+def post_employees_batch(
+    employee_dto: EmployeeBatchDTO,
+    fields: Optional[str] = None,
+    response_format: ResponseFormat = Query(default=NESTED, alias="format"),
+):
+    return get_employees_by_id(employee_dto.ids, fields, response_format == NORMALIZED)
+
+
 @router.get("/{employee_id}", status_code=status.HTTP_200_OK)
-async def get_employee_by_id(employee_id: str):
-    engine = create_engine(db_url)
+def get_employee_by_id(
+    employee_id: str,
+    fields: Optional[str] = None,
+    response_format: ResponseFormat = Query(default=NESTED, alias="format"),
+):
+    tree = parse_fields(fields) or {}
+    normalized = response_format == NORMALIZED
+    engine = get_engine()
 
     with Session(engine) as session:
-        statement = select(Employee).where(Employee.id == employee_id)
-        employee = session.exec(statement).one_or_none()
+        employees = load_employees(session, [employee_id], tree, normalized)
 
-        if employee is None:
+        if not (employees["employees"] if normalized else employees):
             raise HTTPException(status_code=404, detail="Employee not found")
 
-        employee_roles = [
-            {
-                **role.model_dump(),
-                "department": role.department,
-                "company": role.company,
-            }
-            for role in employee.roles
-        ]
-        employee_roles.sort(key=lambda x: x["start_date"], reverse=True)
+        return employees if normalized else employees[0]
 
-        return {
-            **employee.model_dump(),
-            "roles": employee_roles,
-        }
+
+@router.get("/{employee_id}/duplicates", status_code=status.HTTP_200_OK)
+def get_employee_duplicates(
+    employee_id: str,
+    min_score: float = Query(default=config.DUPLICATE_MIN_SCORE, ge=0, le=1),
+    limit: int = Query(default=10, ge=1, le=100),
+):
+    engine = get_engine()
+
+    with Session(engine) as session:
+        duplicates = find_duplicates(session, employee_id, min_score, limit)
+
+    if duplicates is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+
+    return duplicates
 
 
 @router.get("", status_code=status.HTTP_200_OK)
-async def search_employee(request: Request):
-    query_params = request.query_params
-    employee_name = query_params.get("employee_name", "")
-    department_name = query_params.get("department_name", "")
-    role_name = query_params.get("role_name", "")
-    start_year = query_params.get("start_year", "")
-    end_year = query_params.get("end_year", "")
+def search_employee(
+    employee_name: Optional[str] = None,
+    department_name: Optional[str] = None,
+    role_name: Optional[str] = None,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    employed_on: Optional[date] = None,
+    employed_from: Optional[date] = None,
+    employed_to: Optional[date] = None,
+    started_before: Optional[date] = None,
+    started_after: Optional[date] = None,
+    fields: Optional[str] = None,
+    response_format: ResponseFormat = Query(default=NESTED, alias="format"),
+):
+    tree = parse_fields(fields)
+
+    # all role filters have to match the same role, archived ones included
+    role_filters = []
+
+    if department_name:
+        role_filters.append(Department.name == department_name)
+
+    if role_name:
+        role_filters.append(RoleHistory.name == role_name)
+
+    if start_year is not None:
+        role_filters.append(
+            RoleHistory.start_date.between(
+                date(start_year, 1, 1), date(start_year, 12, 31)
+            )
+        )
+
+    if end_year is not None:
+        role_filters.append(
+            RoleHistory.end_date.between(date(end_year, 1, 1), date(end_year, 12, 31))
+        )
+
+    if employed_on is not None:
+        role_filters.append(role_active_on(employed_on, RoleHistory))
+
+    if employed_from is not None or employed_to is not None:
+        role_filters.append(role_overlaps(employed_from, employed_to, RoleHistory))
+
+    if started_before is not None:
+        role_filters.append(RoleHistory.start_date < started_before)
+
+    if started_after is not None:
+        role_filters.append(RoleHistory.start_date > started_after)
+
+    # normalized results include roles, loaded once the employees are known
+    if response_format == NORMALIZED:
+        statement = select(Employee.id)
+    else:
+        statement = select(*model_columns(Employee, tree))
+
+    if employee_name:
+        statement = statement.where(Employee.name == employee_name)
+
+    if role_filters:
+        roles = select(RoleHistory.employee_id).where(*role_filters)
+
+        if department_name:
+            roles = roles.join(Department, Department.id == RoleHistory.department_id)
+
+        statement = statement.where(Employee.id.in_(roles))
+
+    def search(session: Session) -> list:
+        if response_format == NORMALIZED:
+            return session.exec(statement).all()
+
+        return fetch_dicts(session, statement)
 
-    engine = create_engine(db_url)
+    engine = get_engine()
 
     with Session(engine) as session:
-        statement = select(Employee)
-        employees = session.exec(statement).all()
-
-        if len(employee_name) > 0:
-            employees = [
-                employee for employee in employees if employee.name == employee_name
-            ]
-
-        if len(department_name) > 0:
-            employees = [
-                employee
-                for employee in employees
-                for role in employee.roles
-                if role.department.name == department_name
-            ]
-
-        if len(role_name) > 0:
-            employees = [
-                employee
-                for employee in employees
-                for role in employee.roles
-                if role.name == role_name
-            ]
-
-        if len(start_year) > 0:
-            employees = [
-                employee
-                for employee in employees
-                for role in employee.roles
-                if role.start_date.year == int(start_year)
-            ]
-
-        if len(end_year) > 0:
-            employees = [
-                employee
-                for employee in employees
-                for role in employee.roles
-                if role.end_date and role.end_date.year == int(end_year)
-            ]
-
-        return [employee.model_dump() for employee in employees]
+        # roles are spread over the shards, shards read employees from the
+        # main database. employees with matching roles on several shards are
+        # found on each of them
+        if role_filters:
+            results = chain(*fan_out(search, session))
+        else:
+            results = search(session)
+
+        if response_format == NORMALIZED:
+            employee_ids = list(dict.fromkeys(results))
+            return load_employees(session, employee_ids, tree or {}, normalized=True)
+
+        return list({employee["id"]: employee for employee in results}.values())
@@ -1,45 +1,28 @@
-from calendar import c
-
-from fastapi import APIRouter, HTTPException, Request, status
-from sqlalchemy import create_engine
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlmodel import Session, select
 
-from db import db_url
-from db.models.company import Company, CompanyDTO, CompanyValidator
-from db.models.department import Department, DepartmentDTO, DepartmentValidator
+from db import get_engine
+from db.archive import restore_role
+from db.changes import CREATE, UPDATE, record_change, record_delete
+from db.duplicates import refresh_blocking_keys
 from db.models.employee import Employee
 from db.models.role import Role, RoleDTO, RoleValidator
+from db.queries import employee_role_count, role_by_id
+from db.resolver import name_resolver
+from db.shards import fan_out, other_shards, role_shard, shard_coalescer, write_shards
+from db.stats import company_stats_delta
+from utils.admission import admission_control
+from utils.frame_validator import validate_frame
 
 router = APIRouter(
     prefix="/role",
     tags=["role"],
+    dependencies=[Depends(admission_control)],
 )
 
 
-def query_company_by_name(name: str) -> Company:
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statememt = select(Company).where(Company.name == name)
-        company = session.exec(statememt).one_or_none()
-
-        return company
-
-
-def query_department_by_name(name: str, company_id: str) -> Department:
-    engine = create_engine(db_url)
-
-    with Session(engine) as session:
-        statememt = select(Department).where(
-            Department.name == name, Department.company_id == company_id
-        )
-        department = session.exec(statememt).one_or_none()
-
-        return department
-
-
 @router.post("", status_code=status.HTTP_201_CREATED)
-async def create_role(role_dto: RoleDTO):
+def create_role(role_dto: RoleDTO):
     # validate employee details
     errors = RoleValidator().validate(
         {
@@ -50,17 +33,18 @@ async def create_role(role_dto: RoleDTO):
     )
 
     # check if company exists
-    company = query_company_by_name(role_dto.company_name)
-    if company is None:
+    names = name_resolver.names()
+    company_id = names.company_id(role_dto.company_name)
+    if company_id is None:
         errors["company_name"] = ["Company does not exist"]
 
     # check if department exists
-    if company is not None:
-        department = query_department_by_name(role_dto.department_name, company.id)
+    if company_id is not None:
+        department_id = names.department_id(company_id, role_dto.department_name)
 
-        if department is None:
+        if department_id is None:
             errors["department_name"] = [
-                f"Department does not exist for {company.name}"
+                f"Department does not exist for {role_dto.company_name}"
             ]
 
     # return errors if any
@@ -68,21 +52,122 @@ async def create_role(role_dto: RoleDTO):
         raise HTTPException(status_code=400, detail=errors)
 
     # save to db
-    engine = create_engine(db_url)
     role = Role(
-        **role_dto.model_dump(), company_id=company.id, department_id=department.id
+        **role_dto.model_dump(), company_id=company_id, department_id=department_id
     )
 
-    with Session(engine) as session:
-        session.add(role)
-        session.commit()
+    def save(session: Session) -> dict:
+        with company_stats_delta(session, [(role.company_id, role.employee_id)]):
+            session.add(role)
+
+        refresh_blocking_keys(session, [role.employee_id])
+        session.flush()
         session.refresh(role)
+        record_change(session, CREATE, role)
+
+        return role.model_dump()
+
+    return shard_coalescer(names.shard(company_id)).run(save)
+
+
+@router.post("/batch", status_code=status.HTTP_201_CREATED)
+def create_roles(role_dtos: list[RoleDTO], response: Response, dry_run: bool = False):
+    import polars as pl
+
+    # validate role details, all rows at once
+    frame = pl.DataFrame(
+        [role_dto.model_dump() for role_dto in role_dtos], infer_schema_length=None
+    )
+    errors = validate_frame(RoleValidator(), frame)
+
+    # resolve all companies, departments and employees up front
+    engine = get_engine()
+
+    with Session(engine) as session:
+        names = name_resolver.names(session)
+
+        employee_ids = {role_dto.employee_id for role_dto in role_dtos}
+        statement = select(Employee.id).where(Employee.id.in_(employee_ids))
+        existing_employee_ids = set(session.exec(statement).all())
+
+    # check that every company, department and employee exists
+    roles = []
+    for index, role_dto in enumerate(role_dtos):
+        role_errors = errors.setdefault(index, {})
+
+        if role_dto.employee_id not in existing_employee_ids:
+            role_errors["employee_id"] = ["Employee does not exist"]
+
+        company_id = names.company_id(role_dto.company_name)
+        if company_id is None:
+            role_errors["company_name"] = ["Company does not exist"]
+        else:
+            department_id = names.department_id(company_id, role_dto.department_name)
+
+            if department_id is None:
+                role_errors["department_name"] = [
+                    f"Department does not exist for {role_dto.company_name}"
+                ]
+
+        if role_errors:
+            continue
+
+        del errors[index]
+        roles.append(
+            Role(
+                **role_dto.model_dump(),
+                company_id=company_id,
+                department_id=department_id,
+            )
+        )
+
+    # return errors if any
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    # report what would be created without saving
+    if dry_run:
+        response.status_code = status.HTTP_200_OK
+        return {"dry_run": True, "count": len(roles)}
+
+    # save to db in a single transaction per shard
+    shard_roles, positions = {}, []
+    for role in roles:
+        shard = names.shard(role.company_id)
+        shard_roles.setdefault(shard, []).append(role)
+        positions.append((shard, len(shard_roles[shard]) - 1))
+
+    jobs = {}
+    for shard, roles_to_save in shard_roles.items():
 
-    return role.model_dump()
+        def save(session: Session, roles: list = roles_to_save) -> list:
+            employees = [(role.company_id, role.employee_id) for role in roles]
+
+            with company_stats_delta(session, employees):
+                session.add_all(roles)
+
+            refresh_blocking_keys(session, [role.employee_id for role in roles])
+            session.flush()
+
+            # reload the inserted rows in one query instead of a refresh per role
+            statement = select(Role).where(Role.id.in_([role.id for role in roles]))
+            session.exec(statement).all()
+
+            for role in roles:
+                record_change(session, CREATE, role)
+
+            return [role.model_dump() for role in roles]
+
+        jobs[shard] = save
+
+    saved = write_shards(jobs)
+
+    # in the order of the request
+    return [saved[shard][index] for shard, index in positions]
 
 
 @router.put("/{role_id}", status_code=status.HTTP_200_OK)
-async def update_role(role_id: str, role_dto: RoleDTO):
+def update_role(role_id: str, role_dto: RoleDTO):
     # validate employee details
     errors = RoleValidator().validate(
         {
@@ -93,66 +178,126 @@ async def update_role(role_id: str, role_dto: RoleDTO):
     )
 
     # check if company exists
-    company = query_company_by_name(role_dto.company_name)
-    if company is None:
+    names = name_resolver.names()
+    company_id = names.company_id(role_dto.company_name)
+    if company_id is None:
         errors["company_name"] = ["Company does not exist"]
 
     # check if department exists
-    if company is not None:
-        department = query_department_by_name(role_dto.department_name, company.id)
+    if company_id is not None:
+        department_id = names.department_id(company_id, role_dto.department_name)
 
-        if department is None:
+        if department_id is None:
             errors["department_name"] = [
-                f"Department does not exist for {company.name}"
+                f"Department does not exist for {role_dto.company_name}"
             ]
 
     # return errors if any
     if errors:
         raise HTTPException(status_code=400, detail=errors)
 
-    # save to db
-    engine = create_engine(db_url)
+    # find the role before changing it, it may move to another shard
+    source = role_shard(role_id)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Role not found")
 
-    with Session(engine) as session:
-        statement = select(Role).where(Role.id == role_id)
-        role = session.exec(statement).one_or_none()
+    target = names.shard(company_id)
+
+    def load(session: Session) -> Role:
+        restore_role(session, role_id)
+        role = session.scalars(role_by_id(role_id)).one_or_none()
 
         if role is None:
             raise HTTPException(status_code=404, detail="Role not found")
 
-        role.company_id = company.id
-        role.department_id = department.id
-        role.name = role_dto.name
-        role.duties = role_dto.duties
-        role.start_date = role_dto.start_date
-        role.end_date = role_dto.end_date
-        role.employee_company_id = role_dto.employee_company_id
+        return role
+
+    def update(session: Session, role: Role, previous_company_id: str) -> dict:
+        employees = [
+            (previous_company_id, role.employee_id),
+            (company_id, role.employee_id),
+        ]
 
-        session.add(role)
-        session.commit()
+        with company_stats_delta(session, employees):
+            role.company_id = company_id
+            role.department_id = department_id
+            role.name = role_dto.name
+            role.duties = role_dto.duties
+            role.start_date = role_dto.start_date
+            role.end_date = role_dto.end_date
+            role.employee_company_id = role_dto.employee_company_id
+
+            session.add(role)
+
+        refresh_blocking_keys(session, [role.employee_id])
+        session.flush()
         session.refresh(role)
+        record_change(session, UPDATE, role)
+
+        return role.model_dump()
+
+    # save to db
+    def save(session: Session) -> dict:
+        role = load(session)
+
+        return update(session, role, role.company_id)
+
+    if source == target:
+        return shard_coalescer(target).run(save)
+
+    # the role moves to a company on another shard, taken out of the old one
+    # first. stats of the old company are refreshed on its own shard
+    def take(session: Session) -> dict:
+        role = load(session)
+
+        with company_stats_delta(session, [(role.company_id, role.employee_id)]):
+            session.delete(role)
+
+        return role.model_dump()
+
+    moved = shard_coalescer(source).run(take)
+
+    def put(session: Session) -> dict:
+        return update(session, Role(**moved), company_id)
 
-    return role.model_dump()
+    # the role is gone from the source already, it must not be lost to load
+    return shard_coalescer(target).run(put, admit=False)
 
 
 @router.delete("/{role_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_role(role_id: str):
-    engine = create_engine(db_url)
+def delete_role(role_id: str):
+    shard = role_shard(role_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail="Role not found")
 
-    # get employee by role_id
-    with Session(engine) as session:
-        statement = select(Role).where(Role.id == role_id)
-        role = session.exec(statement).one_or_none()
-        employee_roles = role.employee.roles
+    def save(session: Session):
+        # get employee by role_id
+        restore_role(session, role_id)
+        role = session.scalars(role_by_id(role_id)).one_or_none()
+
+        if role is None:
+            raise HTTPException(status_code=404, detail="Role not found")
 
-        # employee should have at least 1 role
-        if len(employee_roles) < 2:
+        # employee should have at least 1 role, on any shard
+        statement = employee_role_count(role.employee_id)
+        role_count = session.scalars(statement).one() + sum(
+            fan_out(
+                lambda session: session.scalars(statement).one(),
+                on=other_shards(shard),
+            )
+        )
+        if role_count < 2:
             raise HTTPException(
                 status_code=400, detail="Employee should have at least 1 role"
             )
 
         # delete role
-        session.delete(role)
-        session.commit()
+        with company_stats_delta(session, [(role.company_id, role.employee_id)]):
+            session.delete(role)
+
+        refresh_blocking_keys(session, [role.employee_id])
+        record_delete(session, "role", role.id, role.company_id)
+
+    shard_coalescer(shard).run(save)
 
     return None
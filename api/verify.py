@@ -0,0 +1,83 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import Session, select
+
+from db.archive import roles_since
+from db.models.employee import Employee
+from db.queries import role_active_on
+from db.resolver import name_resolver
+from db.shards import company_shard, shard_engine
+from utils.admission import admission_control
+
+router = APIRouter(
+    prefix="/verify",
+    tags=["verify"],
+    dependencies=[Depends(admission_control)],
+)
+
+
+@router.get("", status_code=status.HTTP_200_OK)
+def verify_employment(
+    employee_company_id: Optional[str] = None,
+    company_id: Optional[str] = None,
+    employee_name: Optional[str] = None,
+    company_name: Optional[str] = None,
+    role_name: Optional[str] = None,
+    day: Optional[date] = Query(default=None, alias="date"),
+):
+    # lookup either by company issued employee id or by names
+    by_id = employee_company_id is not None and company_id is not None
+    by_name = employee_name is not None and company_name is not None
+
+    if not by_id and not by_name:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "query": [
+                    "Provide employee_company_id and company_id, "
+                    "or employee_name and company_name"
+                ]
+            },
+        )
+
+    # archived roles ended long ago, only look at them when asked about the past
+    role_model = roles_since(day)
+    statement = select(role_model)
+
+    if by_id:
+        statement = statement.where(
+            role_model.company_id == company_id,
+            role_model.employee_company_id == employee_company_id,
+        )
+    else:
+        company_id = name_resolver.names().company_id(company_name)
+
+        if company_id is None:
+            return {"verified": False, "role": None}
+
+        statement = statement.join(
+            Employee, Employee.id == role_model.employee_id
+        ).where(role_model.company_id == company_id, Employee.name == employee_name)
+
+    if role_name is not None:
+        statement = statement.where(role_model.name == role_name)
+
+    if day is not None:
+        statement = statement.where(role_active_on(day, role_model))
+
+    # most recent matching role
+    statement = statement.order_by(role_model.start_date.desc()).limit(1)
+
+    # roles are on the shard of their company, joined with employees of the
+    # main database
+    engine = shard_engine(company_shard(company_id))
+
+    with Session(engine) as session:
+        role = session.exec(statement).first()
+
+        return {
+            "verified": role is not None,
+            "role": role.model_dump() if role is not None else None,
+        }
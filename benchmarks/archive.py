@@ -0,0 +1,131 @@
+"""
+Measure reads of current roles on a copy of the database holding a long
+history of ended roles, with the history in the role table and after moving
+it to the role archive.
+
+    python benchmarks/archive.py [--roles 1000000] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from sqlalchemy import insert  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+from db.archive import archive_cutoff, archive_roles  # noqa: E402
+from db.engine import init_engine  # noqa: E402
+from db.models.department import Department  # noqa: E402
+from db.models.employee import Employee  # noqa: E402
+from db.models.role import Role  # noqa: E402
+from main import app  # noqa: E402
+from utils.metrics import summarize  # noqa: E402
+from utils.uuid_generator import uuid_generator  # noqa: E402
+
+
+def add_history(engine, roles: int) -> tuple:
+    with Session(engine) as session:
+        department = session.exec(select(Department)).first()
+        employee_ids = [uuid_generator() for _ in range(roles // 10)]
+
+        session.execute(
+            insert(Employee),
+            [{"id": i, "name": f"Employee {i}"} for i in employee_ids],
+        )
+
+        # ten ended roles per employee, the last one still open
+        rows = []
+        for n, employee_id in enumerate(employee_ids):
+            start = date(1980, 1, 1) + timedelta(days=random.randrange(10000))
+
+            for i in range(10):
+                end = start + timedelta(days=random.randrange(30, 365))
+                is_open = i == 9 and n % 10 == 0
+                rows.append(
+                    {
+                        "id": uuid_generator(),
+                        "employee_id": employee_id,
+                        "company_id": department.company_id,
+                        "department_id": department.id,
+                        "name": "Clerk",
+                        "duties": "Filing",
+                        "employee_company_id": f"{n}-{i}",
+                        "start_date": start,
+                        "end_date": None if is_open else end,
+                    }
+                )
+                start = end
+
+        session.execute(insert(Role), rows)
+        session.commit()
+
+        return department.id, department.company_id
+
+
+async def run(requests: int, department: tuple, label: str):
+    department_id, company_id = department
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+    ) as client:
+        paths = {
+            "department employees": f"/department/{department_id}/employees",
+            "headcount today": f"/company/{company_id}/headcount",
+        }
+
+        for name, path in paths.items():
+            latencies = []
+
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            summary = summarize(latencies)
+            print(
+                f"{label:8} {name:22} p50 {summary['p50']:7.1f}ms "
+                f"p99 {summary['p99']:7.1f}ms"
+            )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roles", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        shutil.copy(os.path.join(ROOT_DIR, "db", "talent_verify.db"), path)
+        engine = init_engine(f"sqlite:///{path}")
+        department = add_history(engine, args.roles)
+
+        async with app.router.lifespan_context(app):
+            await run(args.requests, department, "hot")
+
+            moved = None
+            while moved != 0:
+                with Session(engine) as session:
+                    moved = archive_roles(session, archive_cutoff(), 10000)
+                    session.commit()
+
+            await run(args.requests, department, "archived")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""
+Measure request latency on a copy of the database grown to a given size,
+without a backup running, during a stepped online backup and during a backup
+copying the whole database in one step.
+
+    python benchmarks/backup.py [--size-mb 500] [--concurrency 10]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from db.backup import backup_database  # noqa: E402
+from db.engine import init_engine  # noqa: E402
+from main import app  # noqa: E402
+from utils.metrics import summarize  # noqa: E402
+
+
+def grow(path: str, size_mb: int):
+    # pad the database with a table the api never reads
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE benchmark_padding (data BLOB)")
+    connection.executemany(
+        "INSERT INTO benchmark_padding VALUES (randomblob(1048576))",
+        [()] * size_mb,
+    )
+    connection.commit()
+    connection.close()
+
+
+async def traffic(client: httpx.AsyncClient, concurrency: int, label: str, done):
+    company_id = (await client.get("/company")).json()[0]["id"]
+    latencies = []
+
+    async def worker(i: int):
+        n = 0
+        while not done():
+            start = time.perf_counter()
+
+            if n % 5:
+                response = await client.get(f"/company/{company_id}")
+            else:
+                response = await client.post(
+                    "/department",
+                    json={"company_id": company_id, "name": f"{label} {i} {n}"},
+                )
+
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+            n += 1
+
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+
+    return latencies
+
+
+async def run(client, concurrency: int, label: str, backup=None, seconds=5.0):
+    thread = None
+    end = time.monotonic() + seconds
+
+    if backup is not None:
+        thread = threading.Thread(target=backup)
+        thread.start()
+
+    def done():
+        if thread is not None:
+            return not thread.is_alive()
+        return time.monotonic() >= end
+
+    start = time.perf_counter()
+    latencies = await traffic(client, concurrency, label, done)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(latencies)
+    print(
+        f"{label:10} {elapsed:6.1f}s {summary['count']:6} requests "
+        f"p50 {summary['p50']:7.1f}ms p99 {summary['p99']:7.1f}ms "
+        f"max {summary['max']:7.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        shutil.copy(os.path.join(ROOT_DIR, "db", "talent_verify.db"), path)
+        grow(path, args.size_mb)
+        init_engine(f"sqlite:///{path}")
+
+        def stepped():
+            backup_database(os.path.join(directory, "stepped.db"))
+
+        def one_step():
+            backup_database(os.path.join(directory, "one_step.db"), pages=-1)
+
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+            ) as client:
+                await run(client, args.concurrency, "no backup")
+                await run(client, args.concurrency, "stepped", stepped)
+                await run(client, args.concurrency, "one step", one_step)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Measure the duplicate employee batch job on copies of the database holding a
+growing number of employees, one in a hundred of them re-created under a
+variant of their name.
+
+    python benchmarks/duplicates.py [--employees 50000] [--steps 3]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from db.duplicates import find_all_duplicates, rebuild_blocking_keys  # noqa: E402
+from db.models.employee import Employee  # noqa: E402
+from utils.uuid_generator import uuid_generator  # noqa: E402
+
+FIRST_NAMES = [
+    "".join(random.choices(string.ascii_lowercase, k=5)).title() for _ in range(500)
+]
+
+
+def random_name() -> str:
+    surname = "".join(random.choices(string.ascii_lowercase, k=7)).title()
+    return f"{random.choice(FIRST_NAMES)} {surname}"
+
+
+def variant(name: str) -> str:
+    first, surname = name.split()
+    return random.choice([f"{first[0]}. {surname}", f"{surname}, {first}", name])
+
+
+def measure(employees: int):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        shutil.copy(os.path.join(ROOT_DIR, "db", "talent_verify.db"), path)
+        engine = create_engine(f"sqlite:///{path}")
+
+        names = [random_name() for _ in range(employees)]
+        names += [variant(name) for name in random.sample(names, employees // 100)]
+
+        with Session(engine) as session:
+            session.execute(
+                insert(Employee),
+                [{"id": uuid_generator(), "name": name} for name in names],
+            )
+            session.commit()
+
+        start = time.perf_counter()
+        rebuild_blocking_keys(engine)
+        indexed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with Session(engine) as session:
+            pairs = sum(1 for _ in find_all_duplicates(session))
+        found = time.perf_counter() - start
+
+        engine.dispose()
+
+    print(
+        f"{len(names):9} employees  index {indexed:6.1f}s  "
+        f"batch {found:6.1f}s  {found * 1e6 / len(names):6.1f} us/employee  "
+        f"{pairs} pairs"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=50000)
+    parser.add_argument("--steps", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    # doubling the employees should about double the time
+    for step in range(args.steps):
+        measure(args.employees * 2**step)
+
+
+if __name__ == "__main__":
+    main()
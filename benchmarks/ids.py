@@ -0,0 +1,106 @@
+"""
+Compare random (version 4) and time ordered (version 7) primary keys on a
+table shaped like role: insert throughput, primary key index size and the
+cost of reading back the most recently inserted rows.
+
+    python benchmarks/ids.py [--rows 200000] [--batch 100]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from utils.uuid_generator import uuid_generator  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE role (
+    id VARCHAR NOT NULL PRIMARY KEY,
+    employee_id VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    start_date DATE NOT NULL
+)
+"""
+
+
+def run(path: str, generate, rows: int, batch: int, label: str):
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA cache_size=-2000")
+    connection.execute(SCHEMA)
+
+    ids = []
+    start = time.perf_counter()
+
+    for offset in range(0, rows, batch):
+        values = [
+            (generate(), generate(), f"Role {i}", "2024-01-01")
+            for i in range(offset, min(offset + batch, rows))
+        ]
+        ids.extend(value[0] for value in values)
+
+        connection.execute("BEGIN")
+        connection.executemany("INSERT INTO role VALUES (?, ?, ?, ?)", values)
+        connection.execute("COMMIT")
+
+    inserts = rows / (time.perf_counter() - start)
+
+    # leaf pages and fill of the primary key index
+    pages, used, size = connection.execute(
+        "SELECT count(*), sum(pgsize - unused), sum(pgsize) FROM dbstat "
+        "WHERE name = 'sqlite_autoindex_role_1' AND pagetype = 'leaf'"
+    ).fetchone()
+    connection.close()
+
+    # read back the newest 1% of rows by key on a cold connection
+    newest = ids[-max(rows // 100, 1) :]
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA cache_size=-2000")
+
+    start = time.perf_counter()
+    for offset in range(0, len(newest), 500):
+        chunk = newest[offset : offset + 500]
+        connection.execute(
+            f"SELECT * FROM role WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        ).fetchall()
+    lookups = (time.perf_counter() - start) * 1000
+    connection.close()
+
+    print(
+        f"{label:4} {inserts:9.0f} inserts/s {pages:6} index pages "
+        f"{used / size:6.1%} full {lookups:7.1f} ms to read newest rows"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(
+            os.path.join(directory, "uuid4.db"),
+            lambda: str(uuid.uuid4()),
+            args.rows,
+            args.batch,
+            "v4",
+        )
+        run(
+            os.path.join(directory, "uuid7.db"),
+            uuid_generator,
+            args.rows,
+            args.batch,
+            "v7",
+        )
+
+
+if __name__ == "__main__":
+    main()
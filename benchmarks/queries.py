@@ -0,0 +1,74 @@
+"""
+Measure the time per query of the statements in db.queries against the same
+statements built from scratch on every call, on a copy of the database.
+Everything is in the page cache, so the difference is Python side overhead.
+
+    python benchmarks/queries.py [--calls 20000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from sqlmodel import Session, func, select  # noqa: E402
+
+from db import queries  # noqa: E402
+from db.engine import init_engine  # noqa: E402
+from db.models.company import Company  # noqa: E402
+from db.models.role import Role  # noqa: E402
+
+STATEMENTS = {
+    "company_by_registration_number": (
+        lambda value: select(Company).where(Company.registration_number == value),
+        queries.company_by_registration_number,
+    ),
+    "role_by_id": (
+        lambda value: select(Role).where(Role.id == value),
+        queries.role_by_id,
+    ),
+    "employee_role_count": (
+        lambda value: select(func.count(Role.id)).where(Role.employee_id == value),
+        queries.employee_role_count,
+    ),
+}
+
+
+def measure(session: Session, build, calls: int) -> float:
+    start = time.perf_counter()
+
+    for i in range(calls):
+        session.scalars(build(str(i))).first()
+
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        shutil.copy(os.path.join(ROOT_DIR, "db", "talent_verify.db"), path)
+        engine = init_engine(f"sqlite:///{path}")
+
+        with Session(engine) as session:
+            for name, (plain, cached) in STATEMENTS.items():
+                # warm up both caches
+                measure(session, plain, 100)
+                measure(session, cached, 100)
+
+                plain_us = measure(session, plain, args.calls)
+                cached_us = measure(session, cached, args.calls)
+
+                print(f"{name:32} {plain_us:7.1f} us -> {cached_us:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare building list responses from ORM instances against building them
+from Core rows, per row time and peak memory on a copy of the database.
+
+    python benchmarks/reads.py [--rows 100000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from sqlalchemy import insert  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+from db.engine import init_engine  # noqa: E402
+from db.models.employee import Employee  # noqa: E402
+from db.rows import fetch_dicts  # noqa: E402
+from utils.fields import model_columns  # noqa: E402
+from utils.uuid_generator import uuid_generator  # noqa: E402
+
+
+def orm_rows(session: Session) -> list:
+    employees = session.exec(select(Employee)).all()
+
+    return [employee.model_dump() for employee in employees]
+
+
+def core_rows(session: Session) -> list:
+    return fetch_dicts(session, select(*model_columns(Employee, None)))
+
+
+def measure(engine, read, label: str, rows: int):
+    # time and memory are measured in separate runs, tracing slows things down
+    with Session(engine) as session:
+        start = time.perf_counter()
+        read(session)
+        elapsed = time.perf_counter() - start
+
+    with Session(engine) as session:
+        tracemalloc.start()
+        read(session)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(
+        f"{label:5} {elapsed * 1e6 / rows:6.2f} us/row "
+        f"{peak / 1024 / 1024:7.1f} MiB peak"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        shutil.copy(os.path.join(ROOT_DIR, "db", "talent_verify.db"), path)
+        engine = init_engine(f"sqlite:///{path}")
+
+        with Session(engine) as session:
+            session.execute(
+                insert(Employee),
+                [
+                    {"id": uuid_generator(), "name": f"Employee {i}"}
+                    for i in range(args.rows)
+                ],
+            )
+            session.commit()
+
+        # warm up the page cache and statement caches
+        with Session(engine) as session:
+            orm_rows(session)
+            core_rows(session)
+
+        measure(engine, orm_rows, "orm", args.rows)
+        measure(engine, core_rows, "core", args.rows)
+
+
+if __name__ == "__main__":
+    main()
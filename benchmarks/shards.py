@@ -0,0 +1,177 @@
+"""
+Measure write throughput of concurrent POST /role requests spread over many
+companies on a copy of the database, first with everything in one database,
+then with the companies moved to shard databases.
+
+    python benchmarks/shards.py [--companies 40] [--roles 20000]
+        [--requests 2000] [--concurrency 30] [--shards 4]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+import config  # noqa: E402
+from db.engine import get_shard_engine, init_engine, shard_path  # noqa: E402
+from db.models.company import Company  # noqa: E402
+from db.models.department import Department  # noqa: E402
+from db.models.employee import Employee  # noqa: E402
+from db.models.role import Role  # noqa: E402
+from db.shards import company_sizes, home_shard, move_company, shards  # noqa: E402
+from main import app  # noqa: E402
+from utils.uuid_generator import uuid_generator  # noqa: E402
+
+
+def add_companies(engine, companies: int, roles: int) -> tuple:
+    with Session(engine) as session:
+        rows = [
+            {
+                "id": uuid_generator(),
+                "name": f"Benchmark {i}",
+                "registration_date": date(2000, 1, 1),
+                "registration_number": f"BENCH-{i}",
+                "address": "1 Benchmark Street",
+                "contact_person": "Benchmark",
+                "contact_phone": "0123456789",
+                "email": "benchmark@example.com",
+            }
+            for i in range(companies)
+        ]
+        session.execute(insert(Company), rows)
+
+        departments = {row["id"]: uuid_generator() for row in rows}
+        session.execute(
+            insert(Department),
+            [
+                {"id": department_id, "company_id": company_id, "name": "Staff"}
+                for company_id, department_id in departments.items()
+            ],
+        )
+
+        employee_ids = [uuid_generator() for _ in range(roles)]
+        session.execute(
+            insert(Employee),
+            [{"id": i, "name": f"Employee {i}"} for i in employee_ids],
+        )
+
+        # a history of roles so the company stats take some work to refresh
+        session.execute(
+            insert(Role),
+            [
+                {
+                    "id": uuid_generator(),
+                    "employee_id": employee_id,
+                    "company_id": company_id,
+                    "department_id": departments[company_id],
+                    "name": "Clerk",
+                    "duties": "Filing",
+                    "start_date": date(2000, 1, 1)
+                    + timedelta(days=random.randrange(7000)),
+                }
+                for employee_id in employee_ids
+                for company_id in [random.choice(list(departments))]
+            ],
+        )
+        session.commit()
+
+    return [row["name"] for row in rows], employee_ids
+
+
+async def run(requests: int, concurrency: int, names: list, employee_ids: list, label):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+    ) as client:
+
+        async def create(i: int):
+            async with semaphore:
+                response = await client.post(
+                    "/role",
+                    json={
+                        "employee_id": random.choice(employee_ids),
+                        "company_name": random.choice(names),
+                        "department_name": "Staff",
+                        "name": f"{label} {i}",
+                        "duties": "Benchmarking",
+                        "start_date": "2024-01-01",
+                    },
+                )
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[create(i) for i in range(requests)])
+        elapsed = time.perf_counter() - start
+
+    print(f"{label:12} {requests / elapsed:8.0f} writes/s")
+
+
+def shard_companies(engine, directory: str, count: int):
+    config.SHARD_COUNT = count
+    config.SHARD_DIR = os.path.join(directory, "shards")
+
+    for shard in shards():
+        os.makedirs(config.SHARD_DIR, exist_ok=True)
+        alembic_config = Config("alembic.ini")
+        alembic_config.set_main_option(
+            "sqlalchemy.url", f"sqlite:///{shard_path(shard)}"
+        )
+        command.upgrade(alembic_config, "head")
+
+    for company_id in company_sizes(engine):
+        move_company(company_id, engine, get_shard_engine(home_shard(company_id)))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=40)
+    parser.add_argument("--roles", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=30)
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    # shard writers only commit side by side with a core each
+    print(f"{os.cpu_count()} cpus")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        shutil.copy(os.path.join(ROOT_DIR, "db", "talent_verify.db"), path)
+        url = f"sqlite:///{path}"
+
+        config.SHARD_COUNT = 0
+        engine = init_engine(url)
+        names, employee_ids = add_companies(engine, args.companies, args.roles)
+        workload = (args.requests, args.concurrency, names, employee_ids)
+
+        async with app.router.lifespan_context(app):
+            await run(*workload, "one database")
+
+        engine = init_engine(url)
+        shard_companies(engine, directory, args.shards)
+
+        async with app.router.lifespan_context(app):
+            await run(*workload, f"{args.shards} shards")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Measure api cold start: import time of main.py and time until the lifespan
+startup has finished, each in a fresh interpreter.
+
+    python benchmarks/startup.py [--runs 5] [--top 15]
+
+Exits with status 1 when the median startup exceeds STARTUP_BUDGET_MS.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# median ms from interpreter start until the app is ready to serve
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "1500"))
+
+STARTUP_SNIPPET = """
+import asyncio, time
+start = time.perf_counter()
+from main import app
+imported = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        pass
+
+asyncio.run(startup())
+ready = time.perf_counter()
+print((imported - start) * 1000, (ready - start) * 1000)
+"""
+
+
+def run(args: list) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_times() -> list:
+    """
+    Parse `python -X importtime` for main.py
+    :return: (module, self us, cumulative us) tuples
+    """
+
+    output = run(["-X", "importtime", "-c", "import main"]).stderr
+    times = []
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        times.append((module.strip(), int(self_us), int(cumulative_us)))
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # warm the bytecode cache so compilation is not measured
+    run(["-c", "import main"])
+
+    imports, startups = [], []
+    for _ in range(args.runs):
+        imported_ms, ready_ms = map(float, run(["-c", STARTUP_SNIPPET]).stdout.split())
+        imports.append(imported_ms)
+        startups.append(ready_ms)
+
+    times = import_times()
+
+    packages = defaultdict(int)
+    for module, self_us, _ in times:
+        packages[module.split(".")[0]] += self_us
+
+    print(f"import main     median {statistics.median(imports):8.1f} ms")
+    print(f"startup ready   median {statistics.median(startups):8.1f} ms")
+    print(f"budget                 {STARTUP_BUDGET_MS:8.1f} ms")
+
+    print("\nslowest imports (cumulative):")
+    for module, _, cumulative_us in sorted(times, key=lambda x: -x[2])[: args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+    print("\nimport time by package (self):")
+    for package, self_us in sorted(packages.items(), key=lambda x: -x[1])[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    if statistics.median(startups) > STARTUP_BUDGET_MS:
+        print("\nstartup budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare validating role rows one at a time with marshmallow against
+validating them as one polars data frame.
+
+    python benchmarks/validation.py [--rows 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import polars as pl
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from db.models.role import RoleValidator  # noqa: E402
+from utils.frame_validator import validate_frame  # noqa: E402
+
+# per row validation is slow, time a sample and extrapolate
+SAMPLE_ROWS = 20000
+
+
+def make_frame(rows: int) -> pl.DataFrame:
+    # every 100th row has an error
+    return pl.DataFrame(
+        {
+            "name": ["" if i % 100 == 0 else f"Role {i}" for i in range(rows)],
+            "company_name": ["Acme"] * rows,
+            "department_name": ["Engineering"] * rows,
+            "duties": ["Build things"] * rows,
+            "employee_company_id": [f"E{i}" for i in range(rows)],
+            "start_date": ["2020-01-01"] * rows,
+            "end_date": [None if i % 3 else "2021-06-30" for i in range(rows)],
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    frame = make_frame(args.rows)
+    schema = RoleValidator()
+
+    sample = frame.head(SAMPLE_ROWS).to_dicts()
+    start = time.perf_counter()
+    for row in sample:
+        schema.validate(row)
+    per_row = (time.perf_counter() - start) / len(sample) * args.rows
+
+    start = time.perf_counter()
+    errors = validate_frame(schema, frame)
+    vectorized = time.perf_counter() - start
+
+    print(f"per row     {per_row:8.2f} s (estimated from {len(sample)} rows)")
+    print(f"data frame  {vectorized:8.2f} s, {len(errors)} invalid rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Measure write throughput of concurrent POST /department requests against
+uvicorn running one and several worker processes on a copy of the database,
+with and without write coalescing. Each worker coalesces only its own writes,
+the workers still take turns on the SQLite write lock.
+
+    python benchmarks/workers.py [--workers 4] [--requests 2000]
+        [--concurrency 64] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(directory: str, port: int, workers: int, coalesce: bool):
+    env = dict(
+        os.environ,
+        # the database url is relative, the workers run from the copy
+        PYTHONPATH=ROOT_DIR,
+        # admission would turn the benchmark's own requests away
+        WRITE_CONCURRENCY_LIMIT="10000",
+        WORKER_WRITE_LIMIT="10000",
+    )
+    if not coalesce:
+        env["WRITE_BATCH_MAX_SIZE"] = "1"
+
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:create_app",
+            "--factory",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=directory,
+        env=env,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient):
+    for _ in range(300):
+        try:
+            response = await client.get("/company")
+            if response.status_code == 200:
+                return response.json()[0]["id"]
+        except httpx.TransportError:
+            pass
+
+        await asyncio.sleep(0.1)
+
+    raise RuntimeError("The server did not start")
+
+
+async def run(port: int, requests: int, concurrency: int, label: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+    ) as client:
+        company_id = await wait_until_ready(client)
+
+        async def create(i: int):
+            async with semaphore:
+                response = await client.post(
+                    "/department",
+                    json={"company_id": company_id, "name": f"{label} {i}"},
+                )
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[create(i) for i in range(requests)])
+        elapsed = time.perf_counter() - start
+
+    print(f"{label:24} {requests / elapsed:8.0f} writes/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores")
+
+    for workers in sorted({1, args.workers}):
+        for coalesce in (False, True):
+            label = f"{workers} workers, " + (
+                "coalesced" if coalesce else "per request"
+            )
+
+            with tempfile.TemporaryDirectory() as directory:
+                os.mkdir(os.path.join(directory, "db"))
+                shutil.copy(
+                    os.path.join(ROOT_DIR, "db", "talent_verify.db"),
+                    os.path.join(directory, "db", "talent_verify.db"),
+                )
+
+                server = start_server(directory, args.port, workers, coalesce)
+                try:
+                    asyncio.run(run(args.port, args.requests, args.concurrency, label))
+                finally:
+                    server.terminate()
+                    server.wait()
+
+
+if __name__ == "__main__":
+    main()
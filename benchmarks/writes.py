@@ -0,0 +1,72 @@
+"""
+Measure write throughput of concurrent POST /department requests on a copy
+of the database, with and without write coalescing.
+
+    python benchmarks/writes.py [--requests 500] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from db.coalescer import write_coalescer  # noqa: E402
+from db.engine import init_engine  # noqa: E402
+from main import app  # noqa: E402
+
+
+async def run(requests: int, concurrency: int, label: str):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+    ) as client:
+        company_id = (await client.get("/company")).json()[0]["id"]
+
+        async def create(i: int):
+            async with semaphore:
+                response = await client.post(
+                    "/department",
+                    json={"company_id": company_id, "name": f"{label} {i}"},
+                )
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[create(i) for i in range(requests)])
+        elapsed = time.perf_counter() - start
+
+    print(f"{label:12} {requests / elapsed:8.0f} writes/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        shutil.copy(os.path.join(ROOT_DIR, "db", "talent_verify.db"), path)
+        init_engine(f"sqlite:///{path}")
+
+        async with app.router.lifespan_context(app):
+            max_batch_size = write_coalescer.max_batch_size
+
+            write_coalescer.max_batch_size = 1
+            await run(args.requests, args.concurrency, "per request")
+
+            write_coalescer.max_batch_size = max_batch_size
+            await run(args.requests, args.concurrency, "coalesced")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+import os
+
+# database connections kept open per worker process
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+
+# refuse to start when the database is not at the latest migration
+CHECK_SCHEMA_VERSION = os.environ.get("CHECK_SCHEMA_VERSION", "1") == "1"
+
+# worker processes started by `python manage.py serve`
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+# concurrent writes arriving within this window are committed together
+WRITE_BATCH_WINDOW_MS = float(os.environ.get("WRITE_BATCH_WINDOW_MS", "2"))
+
+# max number of writes committed in one transaction
+WRITE_BATCH_MAX_SIZE = int(os.environ.get("WRITE_BATCH_MAX_SIZE", "64"))
+
+# writes waiting for the writer, past this new writes are rejected with 503
+WRITE_QUEUE_MAX_DEPTH = int(os.environ.get("WRITE_QUEUE_MAX_DEPTH", "1000"))
+
+# how long a write may wait for the writer before it is given up with 503
+WRITE_QUEUE_TIMEOUT_MS = float(os.environ.get("WRITE_QUEUE_TIMEOUT_MS", "5000"))
+
+# concurrent requests per route and worker, past this requests get 429
+READ_CONCURRENCY_LIMIT = int(os.environ.get("READ_CONCURRENCY_LIMIT", "64"))
+WRITE_CONCURRENCY_LIMIT = int(os.environ.get("WRITE_CONCURRENCY_LIMIT", "32"))
+
+# threads each worker runs sync handlers in, shared by every route
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", "40"))
+
+# concurrent writes per worker across all routes, past this writes get 503.
+# writes hold a thread while they wait for the writer, so keep this well
+# below THREADPOOL_SIZE to leave threads to reads
+WORKER_WRITE_LIMIT = int(os.environ.get("WORKER_WRITE_LIMIT", "16"))
+
+# Retry-After sent with 429 and 503 responses
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", "1"))
+
+# changes kept in the change log, older ones are compacted away
+CHANGE_LOG_MAX_ROWS = int(os.environ.get("CHANGE_LOG_MAX_ROWS", "100000"))
+
+# seconds between change log compactions
+CHANGE_LOG_COMPACT_INTERVAL = float(
+    os.environ.get("CHANGE_LOG_COMPACT_INTERVAL", "300")
+)
+
+# seconds between checks of the change log for events to stream
+CHANGE_STREAM_POLL_INTERVAL = float(
+    os.environ.get("CHANGE_STREAM_POLL_INTERVAL", "0.5")
+)
+
+# events buffered per stream subscriber before it is dropped as too slow
+CHANGE_STREAM_BUFFER_SIZE = int(os.environ.get("CHANGE_STREAM_BUFFER_SIZE", "1000"))
+
+# seconds between keep-alive comments on idle streams
+CHANGE_STREAM_HEARTBEAT = float(os.environ.get("CHANGE_STREAM_HEARTBEAT", "15"))
+
+# seconds a response is replayed for requests repeating its Idempotency-Key
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+
+# stored idempotency keys, the oldest are dropped beyond this
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "100000"))
+
+# seconds a duplicate waits for the first request, also the age after which a
+# request that never finished is presumed lost and its key can be reused
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+
+# seconds between purges of expired idempotency keys
+IDEMPOTENCY_PURGE_INTERVAL = float(os.environ.get("IDEMPOTENCY_PURGE_INTERVAL", "300"))
+
+# serve GET requests from a periodically refreshed read only copy of the
+# database, each worker keeps its own copy
+READ_SNAPSHOT = os.environ.get("READ_SNAPSHOT", "0") == "1"
+
+# directory for the read snapshot copies
+READ_SNAPSHOT_DIR = os.environ.get("READ_SNAPSHOT_DIR", "")
+
+# seconds between read snapshot refreshes
+READ_SNAPSHOT_INTERVAL = float(os.environ.get("READ_SNAPSHOT_INTERVAL", "1"))
+
+# GET requests go to the primary when the snapshot is older than this
+READ_SNAPSHOT_MAX_STALENESS = float(os.environ.get("READ_SNAPSHOT_MAX_STALENESS", "5"))
+
+# database pages copied per step of an online backup
+BACKUP_STEP_PAGES = int(os.environ.get("BACKUP_STEP_PAGES", "256"))
+
+# seconds an online backup pauses between steps to leave the disk to requests
+BACKUP_STEP_PAUSE = float(os.environ.get("BACKUP_STEP_PAUSE", "0.005"))
+
+# directory backups started from the admin endpoint are written to
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+
+# seconds of request latency before a backup to compare the latency during it with
+BACKUP_BASELINE_WINDOW = float(os.environ.get("BACKUP_BASELINE_WINDOW", "60"))
+
+# employees sharing a blocking key with more employees than this are not
+# compared on that key, it is too common to say anything
+DUPLICATE_MAX_BLOCK_SIZE = int(os.environ.get("DUPLICATE_MAX_BLOCK_SIZE", "100"))
+
+# lowest score of a pair of employees reported as possible duplicates
+DUPLICATE_MIN_SCORE = float(os.environ.get("DUPLICATE_MIN_SCORE", "0.6"))
+
+# roles that ended more than this many days ago are moved to the role archive,
+# 0 keeps every role in the role table
+ROLE_ARCHIVE_HORIZON_DAYS = int(os.environ.get("ROLE_ARCHIVE_HORIZON_DAYS", "730"))
+
+# seconds between runs of the role archiver
+ROLE_ARCHIVE_INTERVAL = float(os.environ.get("ROLE_ARCHIVE_INTERVAL", "3600"))
+
+# roles moved to the archive per transaction
+ROLE_ARCHIVE_BATCH_SIZE = int(os.environ.get("ROLE_ARCHIVE_BATCH_SIZE", "1000"))
+
+# number of databases companies, departments and roles are spread over by
+# company, employees stay in the main database. 0 keeps everything in the
+# main database
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "0"))
+
+# directory of the shard databases
+SHARD_DIR = os.environ.get("SHARD_DIR", "shards")
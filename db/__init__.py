@@ -1 +1,2 @@
+from db.engine import get_engine
 from db.urls import db_url
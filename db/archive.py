@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlmodel import Session, delete, select
+
+import config
+from db.models.role import Role, RoleArchive, RoleHistory
+
+COLUMNS = [column.key for column in Role.__table__.columns]
+
+
+def archive_cutoff(today: Optional[date] = None) -> Optional[date]:
+    """
+    Get the day before which ended roles belong in the archive
+    :param today: day to count the horizon back from, today if empty
+    :return: cutoff, None when archiving is turned off
+    """
+
+    if config.ROLE_ARCHIVE_HORIZON_DAYS <= 0:
+        return None
+
+    today = today or date.today()
+
+    return today - timedelta(days=config.ROLE_ARCHIVE_HORIZON_DAYS)
+
+
+def roles_since(start: Optional[date]):
+    """
+    Pick the model to query for roles held on or after a day, roles that
+    could have been archived are only looked up when needed
+    :param start: first day of the period, None for all of history
+    :return: Role or RoleHistory
+    """
+
+    cutoff = archive_cutoff()
+
+    # archived roles ended before the cutoff. with archiving turned off the
+    # archive may still hold roles moved there earlier
+    if cutoff is not None and start is not None and start >= cutoff:
+        return Role
+
+    return RoleHistory
+
+
+def archive_roles(session: Session, cutoff: date, limit: int) -> int:
+    """
+    Move roles that ended before the cutoff to the archive
+    :param session: session of the write
+    :param cutoff: roles ending before this day are moved
+    :param limit: most roles to move
+    :return: number of roles moved
+    """
+
+    statement = select(Role.id).where(Role.end_date < cutoff).limit(limit)
+    role_ids = session.exec(statement).all()
+
+    if not role_ids:
+        return 0
+
+    rows = select(*(Role.__table__.c[name] for name in COLUMNS)).where(
+        Role.id.in_(role_ids)
+    )
+    session.execute(insert(RoleArchive).from_select(COLUMNS, rows))
+    session.execute(delete(Role).where(Role.id.in_(role_ids)))
+
+    return len(role_ids)
+
+
+def restore_role(session: Session, role_id: str) -> bool:
+    """
+    Move an archived role back to the role table so it can be changed, the
+    archiver moves it again later if it still ended before the cutoff
+    :param session: session of the write
+    :param role_id: role id
+    :return: whether the role was archived
+    """
+
+    rows = select(*(RoleArchive.__table__.c[name] for name in COLUMNS)).where(
+        RoleArchive.id == role_id
+    )
+    result = session.execute(insert(Role).from_select(COLUMNS, rows))
+
+    if result.rowcount == 0:
+        return False
+
+    session.execute(delete(RoleArchive).where(RoleArchive.id == role_id))
+
+    return True
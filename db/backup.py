@@ -0,0 +1,212 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import config
+from db.engine import ROOT_DIR, get_engine
+from utils.lock_file import lock_owner, release_lock, take_lock
+from utils.metrics import metrics, summarize
+
+
+def backup_database(
+    path: str,
+    compress: bool = False,
+    pages: int = config.BACKUP_STEP_PAGES,
+    pause: float = config.BACKUP_STEP_PAUSE,
+    progress: Optional[Callable[[int, int], None]] = None,
+    source: Optional[str] = None,
+) -> dict:
+    """
+    Copy the live database to a file a few pages at a time, requests keep
+    being served while it runs
+    :param path: backup file, .gz is appended when compressing
+    :param compress: gzip the backup
+    :param pages: pages copied per step
+    :param pause: seconds to wait between steps
+    :param progress: called with the copied and total pages after each step
+    :param source: database file to copy, the main database if not given
+    :return: path, size and duration of the backup
+    """
+
+    start = time.monotonic()
+    steps = 0
+
+    if compress:
+        path += ".gz"
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = path + ".partial"
+
+    def step(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+        if progress is not None:
+            progress(total - remaining, total)
+
+        # give the disk back to requests between steps
+        time.sleep(pause)
+
+    source = sqlite3.connect(source or get_engine(primary=True).url.database)
+    target = sqlite3.connect(partial)
+
+    try:
+        # copy the database as of now, writes made while the backup runs go
+        # to the WAL and would otherwise restart the copy from scratch
+        source.isolation_level = None
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+        source.backup(target, pages=pages, progress=step)
+        # a single file, without a WAL next to it
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    if compress:
+        with open(partial, "rb") as file, gzip.open(partial + ".gz", "wb") as gz:
+            shutil.copyfileobj(file, gz)
+
+        os.remove(partial)
+        partial += ".gz"
+
+    os.replace(partial, path)
+
+    return {
+        "path": path,
+        "compressed": compress,
+        "size": os.path.getsize(path),
+        "steps": steps,
+        "duration_ms": round((time.monotonic() - start) * 1000, 3),
+    }
+
+
+class BackupJob:
+    """
+    Online backup started from the admin endpoint, running in a thread of
+    the worker that got the request. The status is kept in a file in the
+    backup directory and a lock file next to it holds off backups from
+    other workers, so every worker reports the same backup. Keeps the
+    progress of the last backup along with the request latency of the
+    running worker before and during it.
+    """
+
+    def __init__(self, directory: str = config.BACKUP_DIR):
+        self.directory = os.path.join(ROOT_DIR, directory)
+        self.status_path = os.path.join(self.directory, "backup-status.json")
+        self.lock_path = os.path.join(self.directory, "backup.lock")
+        self._lock = threading.Lock()
+        self._status: dict = {"state": "idle"}
+        self._saved_at = 0.0
+
+    def start(self, compress: bool = False) -> bool:
+        """
+        Start a backup unless one is running in any worker
+        :param compress: gzip the backup
+        :return: whether a backup was started
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        with self._lock:
+            if not take_lock(self.lock_path):
+                return False
+
+            timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            path = os.path.join(self.directory, f"talent_verify-{timestamp}.db")
+
+            self._status = {
+                "state": "running",
+                "path": path,
+                "compressed": compress,
+                "copied_pages": 0,
+                "total_pages": None,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "pid": os.getpid(),
+            }
+            self._save()
+
+        threading.Thread(target=self._run, args=(path, compress), daemon=True).start()
+
+        return True
+
+    def status(self) -> dict:
+        """
+        Get the progress of the running backup or the report of the last one
+        :return: status
+        """
+
+        try:
+            with open(self.status_path) as file:
+                status = json.load(file)
+        except (OSError, ValueError):
+            return {"state": "idle"}
+
+        if status["state"] == "running" and lock_owner(self.lock_path) is None:
+            status.update(state="failed", error="The worker running it stopped")
+
+        if status["state"] == "running" and status["total_pages"]:
+            status["percent"] = round(
+                status["copied_pages"] * 100 / status["total_pages"], 1
+            )
+
+        return status
+
+    def _save(self):
+        # replaced in one go, readers never see half a file
+        partial = self.status_path + ".partial"
+
+        with open(partial, "w") as file:
+            json.dump(self._status, file)
+
+        os.replace(partial, self.status_path)
+        self._saved_at = time.monotonic()
+
+    def _progress(self, copied: int, total: int):
+        with self._lock:
+            self._status["copied_pages"] = copied
+            self._status["total_pages"] = total
+
+            # a few times a second is enough for GET /admin/backup
+            if time.monotonic() - self._saved_at >= 0.2:
+                self._save()
+
+    def _run(self, path: str, compress: bool):
+        start = time.monotonic()
+        before = metrics.samples(
+            "request_ms", since=start - config.BACKUP_BASELINE_WINDOW, until=start
+        )
+
+        try:
+            report = backup_database(path, compress, progress=self._progress)
+        except (sqlite3.Error, OSError) as exc:
+            metrics.increment("backup_failures")
+
+            with self._lock:
+                self._status.update(state="failed", error=str(exc))
+                self._finish()
+            return
+
+        metrics.observe("backup_ms", report["duration_ms"])
+        latency = {
+            "before": summarize(before),
+            "during": summarize(metrics.samples("request_ms", since=start)),
+        }
+
+        with self._lock:
+            self._status.update(state="done", latency_ms=latency, **report)
+            self._finish()
+
+    def _finish(self):
+        self._save()
+        release_lock(self.lock_path)
+
+
+backup_job = BackupJob()
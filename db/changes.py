@@ -0,0 +1,134 @@
+from typing import Optional
+
+from sqlmodel import Session, SQLModel, delete, func, select
+
+from db.coalescer import write_main_database
+from db.models.change import Change
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+
+def record_change(
+    session: Session,
+    operation: str,
+    instance: SQLModel,
+    company_ids: Optional[list] = None,
+):
+    """
+    Add a create or update to the change log, call after the instance has
+    been flushed and refreshed so the logged data is complete
+    :param session: session of the write
+    :param operation: CREATE or UPDATE
+    :param instance: company, department, employee or role
+    :param company_ids: companies an employee has roles at
+    """
+
+    entity = instance.__tablename__
+    company_id = instance.id if entity == "company" else None
+
+    # the log lives in the main database, built now while the instance is
+    # loaded
+    change = Change(
+        entity=entity,
+        entity_id=instance.id,
+        operation=operation,
+        company_id=getattr(instance, "company_id", company_id),
+        company_ids=company_ids,
+        data=instance.model_dump(mode="json"),
+    )
+    write_main_database(session, lambda session: session.add(change))
+
+
+def record_delete(
+    session: Session,
+    entity: str,
+    entity_id: str,
+    company_id: Optional[str] = None,
+    company_ids: Optional[list] = None,
+):
+    """
+    Add a delete to the change log
+    :param session: session of the write
+    :param entity: table name of the deleted row
+    :param entity_id: id of the deleted row
+    :param company_id: company the deleted row belonged to
+    :param company_ids: companies a deleted employee had roles at
+    """
+
+    change = Change(
+        entity=entity,
+        entity_id=entity_id,
+        operation=DELETE,
+        company_id=company_id,
+        company_ids=company_ids,
+    )
+    write_main_database(session, lambda session: session.add(change))
+
+
+def latest_cursor(session: Session) -> int:
+    """
+    Get the cursor of the newest change
+    :param session: database session
+    :return: cursor, 0 when the log is empty
+    """
+
+    return session.exec(select(func.max(Change.id))).one() or 0
+
+
+def read_changes(session: Session, since: int, limit: int) -> list[dict]:
+    """
+    Read the changes made after a cursor, oldest first
+    :param session: database session
+    :param since: cursor to read after
+    :param limit: maximum number of changes
+    :return: changes
+    """
+
+    statement = select(Change).where(Change.id > since).order_by(Change.id).limit(limit)
+    changes = session.exec(statement).all()
+
+    return [
+        {
+            "cursor": change.id,
+            "entity": change.entity,
+            "entity_id": change.entity_id,
+            "operation": change.operation,
+            "company_id": change.company_id,
+            "company_ids": change.company_ids,
+            "data": change.data,
+            "created_at": change.created_at,
+        }
+        for change in changes
+    ]
+
+
+def oldest_cursor(session: Session) -> int:
+    """
+    Get the oldest cursor changes can still be read from
+    :param session: database session
+    :return: cursor, 0 when nothing was compacted
+    """
+
+    oldest = session.exec(select(func.min(Change.id))).one()
+
+    return oldest - 1 if oldest is not None else 0
+
+
+def compact_changes(session: Session, max_rows: int) -> int:
+    """
+    Delete the oldest changes so at most max_rows remain
+    :param session: database session
+    :param max_rows: number of changes to keep
+    :return: number of deleted changes
+    """
+
+    newest = session.exec(select(func.max(Change.id))).one()
+
+    if newest is None:
+        return 0
+
+    result = session.execute(delete(Change).where(Change.id <= newest - max_rows))
+
+    return result.rowcount
@@ -0,0 +1,243 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Optional, TypeVar
+
+from sqlmodel import Session
+
+import config
+from db.engine import get_engine, get_shard_engine
+from utils.admission import Overloaded
+from utils.metrics import metrics
+
+T = TypeVar("T")
+
+# sentinel that tells the writer thread to stop
+_STOP = object()
+
+# session info key of the writes to the main database made by shard jobs
+_MAIN_DATABASE_WRITES = "main_database_writes"
+
+
+def write_main_database(session: Session, write: Callable[[Session], None]):
+    """
+    Write to the main database as part of a job. Jobs of the main database
+    writer run it right away. Shard databases cannot write to the main
+    database, so for shard jobs it runs in the main database writer right
+    after the shard commits, before the job's request gets its result.
+    :param session: session of the job
+    :param write: function taking a session of the main database
+    """
+
+    writes = session.info.get(_MAIN_DATABASE_WRITES)
+
+    if writes is None:
+        write(session)
+    else:
+        writes.append(write)
+
+
+class WriteCoalescer:
+    """
+    Commits the writes of concurrent requests together. A single writer
+    thread collects the jobs submitted within a short window and runs them
+    in one transaction, each job in its own savepoint so a failing job only
+    rolls back its own changes and the others still commit.
+
+    Writes are turned away when more than max_queue_depth are waiting, and
+    given up when they wait longer than timeout for the writer.
+
+    Each shard database has its own writer, so writes to different shards
+    commit concurrently.
+    """
+
+    def __init__(
+        self,
+        window: float = config.WRITE_BATCH_WINDOW_MS / 1000,
+        max_batch_size: int = config.WRITE_BATCH_MAX_SIZE,
+        max_queue_depth: int = config.WRITE_QUEUE_MAX_DEPTH,
+        timeout: float = config.WRITE_QUEUE_TIMEOUT_MS / 1000,
+        shard: Optional[int] = None,
+    ):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+        self.timeout = timeout
+        self.shard = shard
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the writer thread
+        """
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            name = "write-coalescer"
+            if self.shard is not None:
+                name += f"-shard-{self.shard}"
+
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Commit everything queued so far and stop the writer thread
+        """
+
+        with self._lock:
+            if self._thread is None:
+                return
+
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def run(self, job: Callable[[Session], T], admit: bool = True) -> T:
+        """
+        Run a write job in the next batch and wait for the batch to commit.
+        The job gets the batch session, must not commit, and should return
+        plain data since the session is closed after the commit.
+        :param job: function taking a session
+        :param admit: turn the job away when the queue is full or the writer
+        is too slow, False for follow-ups of writes committed elsewhere
+        that must not be lost
+        :return: result of the job
+        """
+
+        self.start()
+
+        if admit and self.depth() >= self.max_queue_depth:
+            metrics.increment("writes_rejected")
+            raise Overloaded("Too many writes waiting, try again later")
+
+        future: Future = Future()
+        self._queue.put((job, future, time.monotonic()))
+
+        if not admit:
+            return future.result()
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # only give up if the job has not started, otherwise wait for it
+            if not future.cancel():
+                return future.result()
+
+            metrics.increment("writes_timed_out")
+            raise Overloaded("Timed out waiting for the database, try again later")
+
+    def depth(self) -> int:
+        """
+        Number of writes waiting for the writer thread
+        :return: queue depth
+        """
+
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            stop = False
+
+            # collect the jobs that arrive within the window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(timeout, 0))
+                except queue.Empty:
+                    break
+
+                if item is _STOP:
+                    stop = True
+                    break
+
+                batch.append(item)
+
+            self._commit(batch)
+
+            if stop:
+                return
+
+    def _commit(self, queued: list):
+        now = time.monotonic()
+        batch = []
+
+        for job, future, queued_at in queued:
+            # skip the jobs whose requests gave up waiting
+            if future.set_running_or_notify_cancel():
+                metrics.observe("write_queue_wait_ms", (now - queued_at) * 1000)
+                batch.append((job, future))
+
+        if not batch:
+            return
+
+        metrics.observe("write_batch_size", len(batch))
+
+        if self.shard is None:
+            engine = get_engine()
+        else:
+            engine = get_shard_engine(self.shard)
+
+        engine = engine.execution_options(sqlite_begin="BEGIN IMMEDIATE")
+        outcomes = []
+        writes = []
+
+        try:
+            with Session(engine) as session:
+                if self.shard is not None:
+                    session.info[_MAIN_DATABASE_WRITES] = writes
+
+                for job, future in batch:
+                    queued = len(writes)
+
+                    try:
+                        with session.begin_nested():
+                            outcomes.append((future, job(session), None))
+                    except Exception as exc:
+                        # the job was rolled back, so are its other writes
+                        del writes[queued:]
+                        outcomes.append((future, None, exc))
+
+                session.commit()
+
+            metrics.observe("write_commit_ms", (time.monotonic() - now) * 1000)
+        except Exception as exc:
+            # nothing was committed, every job fails
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        failed = None
+
+        if writes:
+            try:
+                # the shard has committed, wait for the main database
+                # however busy it is rather than answer with an overload
+                write_coalescer.run(
+                    lambda session: [write(session) for write in writes],
+                    admit=False,
+                )
+            except Exception as exc:
+                # the shard commit stands, but the requests learn about it
+                failed = exc
+
+        for future, result, exc in outcomes:
+            if exc is not None or failed is not None:
+                future.set_exception(exc or failed)
+            else:
+                future.set_result(result)
+
+
+write_coalescer = WriteCoalescer()
@@ -0,0 +1,339 @@
+import difflib
+import re
+import unicodedata
+from itertools import chain, combinations, groupby
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import Engine, insert
+from sqlmodel import Session, delete, func, select
+
+import config
+from db.coalescer import write_main_database
+from db.models.blocking_key import BlockingKey
+from db.models.employee import Employee
+from db.models.role import RoleHistory
+from db.shards import fan_out
+
+# employees per transaction when rebuilding keys, and per batch of blocks
+# scored together when looking for duplicates in the whole table
+CHUNK_SIZE = 1000
+
+# weights of the signals making up the score of a pair, they add up to 1
+NAME_WEIGHT = 0.6
+EMPLOYEE_COMPANY_ID_WEIGHT = 0.25
+ROLE_NAME_WEIGHT = 0.15
+
+# words of a name paired up into blocking keys
+MAX_PAIRED_WORDS = 4
+
+# name similarity from which a name counts as similar in the reasons
+SIMILAR_NAME = 0.8
+
+NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a name for comparison, case, accents and punctuation are dropped
+    :param name: name
+    :return: lower case words separated by single spaces
+    """
+
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+
+    return " ".join(NON_ALPHANUMERIC.sub(" ", name.lower()).split())
+
+
+def blocking_keys(name: str, employee_company_ids: Iterable[tuple]) -> set:
+    """
+    Get the keys an employee is filed under, only employees sharing a key are
+    compared with each other
+    :param name: employee name
+    :param employee_company_ids: (company id, employee company id) of each role
+    :return: keys
+    """
+
+    words = normalize_name(name).split()
+    keys = set()
+
+    if words:
+        # same words in any order
+        keys.add("name:" + " ".join(sorted(words)))
+
+    if len(words) > 2:
+        # any two of the first few words, survives added or dropped middle names
+        for pair in combinations(sorted(set(words[:MAX_PAIRED_WORDS])), 2):
+            keys.add("name:" + " ".join(pair))
+
+    if len(words) > 1:
+        # initial and surname, survives abbreviated first names
+        keys.add(f"initial:{words[0][0]} {words[-1]}")
+
+    for company_id, employee_company_id in employee_company_ids:
+        keys.add(f"employee_company_id:{company_id}:{employee_company_id}")
+
+    return keys
+
+
+def load_profiles(session: Session, employee_ids: Iterable[str]) -> dict:
+    """
+    Load what duplicates are scored on for a set of employees
+    :param session: database session
+    :param employee_ids: employee ids
+    :return: profiles keyed by employee id, missing employees are left out
+    """
+
+    employee_ids = list(set(employee_ids))
+    profiles = {}
+
+    statement = select(Employee.id, Employee.name).where(Employee.id.in_(employee_ids))
+
+    for employee_id, name in session.execute(statement):
+        profiles[employee_id] = {
+            "id": employee_id,
+            "name": name,
+            "words": " ".join(sorted(normalize_name(name).split())),
+            "employee_company_ids": set(),
+            "role_names": set(),
+        }
+
+    statement = select(
+        RoleHistory.employee_id,
+        RoleHistory.company_id,
+        RoleHistory.employee_company_id,
+        RoleHistory.name,
+    ).where(RoleHistory.employee_id.in_(employee_ids))
+
+    # roles are spread over the shards
+    roles = fan_out(lambda session: session.execute(statement).all(), session)
+
+    for employee_id, company_id, employee_company_id, role_name in chain(*roles):
+        profile = profiles.get(employee_id)
+
+        if profile is None:
+            continue
+
+        if employee_company_id:
+            employee_company_id = employee_company_id.strip().lower()
+            profile["employee_company_ids"].add((company_id, employee_company_id))
+
+        profile["role_names"].add(normalize_name(role_name))
+
+    for profile in profiles.values():
+        profile["keys"] = blocking_keys(
+            profile["name"], profile["employee_company_ids"]
+        )
+
+    return profiles
+
+
+def score_pair(a: dict, b: dict) -> tuple:
+    """
+    Score how likely two employees are the same person
+    :param a: profile of one employee
+    :param b: profile of the other employee
+    :return: score between 0 and 1, reasons
+    """
+
+    reasons = []
+
+    name = difflib.SequenceMatcher(None, a["words"], b["words"]).ratio()
+    if name == 1:
+        reasons.append("same name")
+    elif name >= SIMILAR_NAME:
+        reasons.append("similar name")
+
+    employee_company_id = 0.0
+    if a["employee_company_ids"] & b["employee_company_ids"]:
+        employee_company_id = 1.0
+        reasons.append("same employee company id")
+
+    role_names = 0.0
+    if a["role_names"] & b["role_names"]:
+        shared = a["role_names"] & b["role_names"]
+        role_names = len(shared) / len(a["role_names"] | b["role_names"])
+        reasons.append("shared role names")
+
+    score = (
+        NAME_WEIGHT * name
+        + EMPLOYEE_COMPANY_ID_WEIGHT * employee_company_id
+        + ROLE_NAME_WEIGHT * role_names
+    )
+
+    return round(score, 3), reasons
+
+
+def refresh_blocking_keys(session: Session, employee_ids: Iterable[str]):
+    """
+    Recompute the blocking keys of the given employees, call before commit
+    so the keys are written in the same transaction as the employees. In
+    shard transactions they are written right after the shard commits.
+    :param session: database session
+    :param employee_ids: ids of employees whose name or roles changed
+    """
+
+    employee_ids = list(set(employee_ids))
+
+    def refresh(session: Session):
+        delete_blocking_keys(session, employee_ids)
+
+        rows = [
+            {"key": key, "employee_id": employee_id}
+            for employee_id, profile in load_profiles(session, employee_ids).items()
+            for key in profile["keys"]
+        ]
+
+        if rows:
+            session.execute(insert(BlockingKey), rows)
+
+    write_main_database(session, refresh)
+
+
+def delete_blocking_keys(session: Session, employee_ids: Iterable[str]):
+    """
+    Remove the blocking keys of employees about to be deleted
+    :param session: database session
+    :param employee_ids: employee ids
+    """
+
+    statement = delete(BlockingKey).where(BlockingKey.employee_id.in_(employee_ids))
+    write_main_database(session, lambda session: session.execute(statement))
+
+
+def rebuild_blocking_keys(engine: Engine) -> int:
+    """
+    Recompute the blocking keys of every employee, a transaction per chunk
+    :param engine: engine of the database
+    :return: number of employees
+    """
+
+    with Session(engine) as session:
+        employee_ids = session.exec(select(Employee.id)).all()
+
+    for i in range(0, len(employee_ids), CHUNK_SIZE):
+        with Session(engine) as session:
+            refresh_blocking_keys(session, employee_ids[i : i + CHUNK_SIZE])
+            session.commit()
+
+    return len(employee_ids)
+
+
+def find_duplicates(
+    session: Session,
+    employee_id: str,
+    min_score: float = config.DUPLICATE_MIN_SCORE,
+    limit: int = 10,
+) -> Optional[list]:
+    """
+    Find employees that are likely the same person as an employee
+    :param session: database session
+    :param employee_id: employee id
+    :param min_score: lowest score to report
+    :param limit: most candidates to report
+    :return: candidates with the best score first, None if the employee does
+    not exist
+    """
+
+    profile = load_profiles(session, [employee_id]).get(employee_id)
+
+    if profile is None:
+        return None
+
+    # keys shared by too many employees match half the table
+    keys = (
+        select(BlockingKey.key)
+        .where(BlockingKey.key.in_(profile["keys"]))
+        .group_by(BlockingKey.key)
+        .having(func.count() <= config.DUPLICATE_MAX_BLOCK_SIZE)
+    )
+    statement = (
+        select(BlockingKey.employee_id)
+        .distinct()
+        .where(BlockingKey.key.in_(keys), BlockingKey.employee_id != employee_id)
+    )
+    candidate_ids = session.exec(statement).all()
+
+    candidates = []
+
+    for candidate in load_profiles(session, candidate_ids).values():
+        score, reasons = score_pair(profile, candidate)
+
+        if score >= min_score:
+            candidates.append(
+                {
+                    "employee_id": candidate["id"],
+                    "name": candidate["name"],
+                    "score": score,
+                    "reasons": reasons,
+                }
+            )
+
+    candidates.sort(key=lambda candidate: candidate["score"], reverse=True)
+
+    return candidates[:limit]
+
+
+def _score_blocks(
+    session: Session, blocks: list, skipped: set, min_score: float
+) -> Iterator[tuple]:
+    profiles = load_profiles(session, {i for _, block in blocks for i in block})
+
+    for key, block in blocks:
+        for a, b in combinations(sorted(block), 2):
+            if a not in profiles or b not in profiles:
+                continue
+
+            # pairs sharing several keys are only scored in the block of the
+            # first of them, keys before this one have all been seen
+            shared = (profiles[a]["keys"] & profiles[b]["keys"]) - skipped
+            if key != min(shared, default=key):
+                continue
+
+            score, reasons = score_pair(profiles[a], profiles[b])
+
+            if score >= min_score:
+                yield a, b, score, reasons
+
+
+def find_all_duplicates(
+    session: Session,
+    min_score: float = config.DUPLICATE_MIN_SCORE,
+    max_block_size: int = config.DUPLICATE_MAX_BLOCK_SIZE,
+) -> Iterator[tuple]:
+    """
+    Find likely duplicates among all employees. Only employees sharing a
+    blocking key are compared and large blocks are skipped, so the work grows
+    with the number of employees rather than the number of pairs.
+    :param session: database session
+    :param min_score: lowest score to report
+    :param max_block_size: skip keys shared by more employees than this
+    :return: employee id, duplicate id, score and reasons of each pair
+    """
+
+    # the primary key keeps the rows of a block together, in key order
+    statement = select(BlockingKey.key, BlockingKey.employee_id).order_by(
+        BlockingKey.key
+    )
+    rows = session.execute(statement.execution_options(yield_per=CHUNK_SIZE))
+
+    blocks, size, skipped = [], 0, set()
+
+    for key, group in groupby(rows, key=lambda row: row[0]):
+        block = [employee_id for _, employee_id in group]
+
+        if len(block) > max_block_size:
+            skipped.add(key)
+            continue
+
+        if len(block) < 2:
+            continue
+
+        blocks.append((key, block))
+        size += len(block)
+
+        if size >= CHUNK_SIZE:
+            yield from _score_blocks(session, blocks, skipped, min_score)
+            blocks, size = [], 0
+
+    yield from _score_blocks(session, blocks, skipped, min_score)
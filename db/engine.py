@@ -0,0 +1,267 @@
+import ast
+import os
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import Engine, create_engine, event, text
+from sqlalchemy.orm import configure_mappers
+
+import config
+from db.urls import db_url
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_engine: Optional[Engine] = None
+
+# engines of the shard databases by shard number
+_shard_engines: dict[int, Engine] = {}
+_shard_engines_lock = threading.Lock()
+
+# name shard connections attach the main database under, and the tables of
+# the main database read by queries run on a shard
+MAIN_DATABASE = "main_database"
+MAIN_DATABASE_TABLES = ("employee",)
+
+# engine of the read snapshot when the current request may read from it
+_read_engine: ContextVar[Optional[Engine]] = ContextVar("read_engine", default=None)
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # let sqlalchemy emit BEGIN itself, pysqlite's implicit transactions
+    # break savepoints
+    dbapi_connection.isolation_level = None
+
+    cursor = dbapi_connection.cursor()
+    # let readers run alongside the single writer
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _configure_read_only(dbapi_connection, connection_record):
+    # same transaction handling as the primary, the copy is never written
+    dbapi_connection.isolation_level = None
+
+
+def _begin_sqlite(connection):
+    # writers pass sqlite_begin="BEGIN IMMEDIATE" to take the lock up front
+    connection.exec_driver_sql(
+        connection.get_execution_options().get("sqlite_begin", "BEGIN")
+    )
+
+
+def init_engine(url: str = db_url) -> Engine:
+    """
+    Create the engine shared by all requests of this worker process
+    :param url: database url
+    :return: engine
+    """
+
+    global _engine
+
+    if _engine is not None:
+        return _engine
+
+    _engine = create_engine(
+        url, pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_POOL_SIZE
+    )
+    event.listen(_engine, "connect", _configure_sqlite)
+    event.listen(_engine, "begin", _begin_sqlite)
+
+    return _engine
+
+
+def create_read_only_engine(path: str) -> Engine:
+    """
+    Create an engine for a read only copy of the database
+    :param path: path of the copy
+    :return: engine
+    """
+
+    engine = create_engine(
+        f"sqlite:///file:{path}?mode=ro&uri=true",
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_POOL_SIZE,
+    )
+    event.listen(engine, "connect", _configure_read_only)
+    event.listen(engine, "begin", _begin_sqlite)
+
+    return engine
+
+
+def _attach_main_database(dbapi_connection, connection_record):
+    # employees live in the main database, read only so shard transactions
+    # never take its write lock
+    path = os.path.abspath(get_engine(primary=True).url.database)
+    dbapi_connection.execute(
+        f"ATTACH DATABASE 'file:{path}?mode=ro' AS {MAIN_DATABASE}"
+    )
+
+    # the shard has empty copies of these tables, temporary views are looked
+    # up first so queries joining them read the main database instead
+    for table in MAIN_DATABASE_TABLES:
+        dbapi_connection.execute(
+            f"CREATE TEMP VIEW {table} AS SELECT * FROM {MAIN_DATABASE}.{table}"
+        )
+
+
+def shard_path(shard: int) -> str:
+    """
+    Get the file of a shard database
+    :param shard: shard number
+    :return: path
+    """
+
+    return os.path.join(ROOT_DIR, config.SHARD_DIR, f"shard-{shard}.db")
+
+
+def get_shard_engine(shard: int) -> Engine:
+    """
+    Get the engine of a shard database, creating it on first use. Shard
+    connections see the employees of the main database as well.
+    :param shard: shard number
+    :return: engine
+    """
+
+    engine = _shard_engines.get(shard)
+
+    if engine is not None:
+        return engine
+
+    with _shard_engines_lock:
+        if shard not in _shard_engines:
+            os.makedirs(os.path.dirname(shard_path(shard)), exist_ok=True)
+
+            engine = create_engine(
+                f"sqlite:///file:{shard_path(shard)}?uri=true",
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_POOL_SIZE,
+            )
+            event.listen(engine, "connect", _configure_sqlite)
+            event.listen(engine, "connect", _attach_main_database)
+            event.listen(engine, "begin", _begin_sqlite)
+            _shard_engines[shard] = engine
+
+        return _shard_engines[shard]
+
+
+def get_engine(primary: bool = False) -> Engine:
+    """
+    Get the shared engine, creating it on first use. Requests routed to the
+    read snapshot get the snapshot engine instead.
+    :param primary: always get the engine of the primary database
+    :return: engine
+    """
+
+    read_engine = _read_engine.get()
+
+    if read_engine is not None and not primary:
+        return read_engine
+
+    return _engine if _engine is not None else init_engine()
+
+
+def use_read_engine(engine: Optional[Engine]):
+    """
+    Route get_engine() of the current request to a read only engine
+    :param engine: read only engine, None to use the primary
+    :return: token to restore the previous engine with
+    """
+
+    return _read_engine.set(engine)
+
+
+def reset_read_engine(token):
+    """
+    Undo use_read_engine
+    :param token: token returned by use_read_engine
+    """
+
+    _read_engine.reset(token)
+
+
+def dispose_engine():
+    """
+    Close all pooled connections of the shared engine and the shard engines
+    """
+
+    global _engine
+
+    with _shard_engines_lock:
+        for engine in _shard_engines.values():
+            engine.dispose()
+
+        _shard_engines.clear()
+
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+def warm_up(engine: Engine):
+    """
+    Open the connection pool and load the schema on every connection so the
+    first requests of a worker do not pay for it
+    :param engine: engine to warm up
+    """
+
+    configure_mappers()
+
+    connections = [engine.connect() for _ in range(config.DB_POOL_SIZE)]
+
+    for connection in connections:
+        connection.execute(text("SELECT count(*) FROM sqlite_master")).scalar()
+        connection.close()
+
+
+def migration_head() -> Optional[str]:
+    """
+    Find the latest migration by reading the revision ids of the migration
+    scripts, this avoids importing alembic on startup
+    :return: head revision id
+    """
+
+    revisions, down_revisions = set(), set()
+    versions_dir = os.path.join(ROOT_DIR, "migrations", "versions")
+
+    for filename in os.listdir(versions_dir):
+        if not filename.endswith(".py"):
+            continue
+
+        with open(os.path.join(versions_dir, filename)) as file:
+            module = ast.parse(file.read())
+
+        for node in module.body:
+            if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+                value = ast.literal_eval(node.value)
+
+                if node.target.id == "revision":
+                    revisions.add(value)
+                elif node.target.id == "down_revision" and value is not None:
+                    down_revisions.add(value)
+
+    heads = revisions - down_revisions
+
+    return heads.pop() if len(heads) == 1 else None
+
+
+def check_schema_version(engine: Engine, command: str = "alembic upgrade head"):
+    """
+    Make sure the database has all migrations applied
+    :param engine: engine to check
+    :param command: command that applies the migrations, for the error
+    """
+
+    head = migration_head()
+
+    with engine.connect() as connection:
+        current = connection.execute(
+            text("SELECT version_num FROM alembic_version")
+        ).scalar()
+
+    if current != head:
+        raise RuntimeError(
+            f"Database is at revision {current}, expected {head}. "
+            f"Run `{command}` first."
+        )
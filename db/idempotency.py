@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, delete, func, select
+
+from db.models.idempotency_key import IdempotencyKey
+
+
+def _cutoff(seconds: float) -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=seconds)
+
+
+def get_key(session: Session, key: str) -> Optional[IdempotencyKey]:
+    """
+    Get a stored idempotency key
+    :param session: database session
+    :param key: scoped idempotency key
+    :return: key, None if unknown
+    """
+
+    return session.get(IdempotencyKey, key)
+
+
+def claim_key(
+    session: Session, key: str, request_hash: str, ttl: float, lock_timeout: float
+) -> bool:
+    """
+    Claim a key for a request about to run. Expired keys and keys whose
+    request has been running longer than lock_timeout can be claimed again.
+    :param session: session of the write
+    :param key: scoped idempotency key
+    :param request_hash: hash of the request body
+    :param ttl: seconds a stored response is replayed for
+    :param lock_timeout: seconds after which a running request is presumed lost
+    :return: True if this request claimed the key
+    """
+
+    statement = insert(IdempotencyKey).values(key=key, request_hash=request_hash)
+    statement = statement.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={
+            "request_hash": request_hash,
+            "status_code": None,
+            "content_type": None,
+            "body": None,
+            "created_at": func.now(),
+        },
+        where=or_(
+            IdempotencyKey.created_at < _cutoff(ttl),
+            (IdempotencyKey.status_code.is_(None))
+            & (IdempotencyKey.created_at < _cutoff(lock_timeout)),
+        ),
+    )
+
+    return session.execute(statement).rowcount == 1
+
+
+def complete_key(
+    session: Session, key: str, status_code: int, content_type: str, body: bytes
+):
+    """
+    Store the response of a claimed key
+    :param session: session of the write
+    :param key: scoped idempotency key
+    :param status_code: response status
+    :param content_type: response content type
+    :param body: response body
+    """
+
+    key = session.get(IdempotencyKey, key)
+
+    if key is not None:
+        key.status_code = status_code
+        key.content_type = content_type
+        key.body = body
+        session.add(key)
+
+
+def release_key(session: Session, key: str):
+    """
+    Forget a claimed key without a response, so a retry runs again
+    :param session: session of the write
+    :param key: scoped idempotency key
+    """
+
+    session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+
+
+def purge_keys(session: Session, ttl: float, max_rows: int) -> int:
+    """
+    Delete expired keys, then the oldest keys so at most max_rows remain
+    :param session: session of the write
+    :param ttl: seconds a stored response is replayed for
+    :param max_rows: number of keys to keep
+    :return: number of deleted keys
+    """
+
+    result = session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < _cutoff(ttl))
+    )
+    deleted = result.rowcount
+
+    count = session.exec(select(func.count(IdempotencyKey.key))).one()
+
+    if count > max_rows:
+        oldest = (
+            select(IdempotencyKey.key)
+            .order_by(IdempotencyKey.created_at)
+            .limit(count - max_rows)
+        )
+        result = session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.key.in_(oldest))
+        )
+        deleted += result.rowcount
+
+    return deleted
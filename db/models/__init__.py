@@ -1,4 +1,9 @@
+from db.models.blocking_key import BlockingKey
+from db.models.cache_version import CacheVersion
+from db.models.change import Change
 from db.models.company import Company
+from db.models.company_stats import CompanyStats
 from db.models.department import Department
 from db.models.employee import Employee
-from db.models.role import Role
+from db.models.idempotency_key import IdempotencyKey
+from db.models.role import Role, RoleArchive, RoleHistory
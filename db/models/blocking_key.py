@@ -0,0 +1,9 @@
+from sqlmodel import Field, SQLModel
+
+
+class BlockingKey(SQLModel, table=True):
+    __tablename__ = "blocking_key"
+
+    # employees sharing a key are compared when looking for duplicates
+    key: str = Field(primary_key=True)
+    employee_id: str = Field(foreign_key="employee.id", primary_key=True, index=True)
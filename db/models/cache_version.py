@@ -0,0 +1,8 @@
+from sqlmodel import Field, SQLModel
+
+
+class CacheVersion(SQLModel, table=True):
+    __tablename__ = "cache_version"
+
+    name: str = Field(primary_key=True)
+    version: int = Field(default=0)
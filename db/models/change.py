@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import JSON, Column, DateTime, func
+from sqlmodel import Field, SQLModel
+
+
+class Change(SQLModel, table=True):
+    # autoincrement so ids of compacted changes are never reused as cursors
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entity: str
+    entity_id: str
+    operation: str
+    company_id: Optional[str] = Field(default=None)
+    # companies an employee has roles at, employee changes are not tied to
+    # a single company
+    company_ids: Optional[list] = Field(default=None, sa_column=Column(JSON))
+    data: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), default=func.now())
+    )
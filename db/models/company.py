@@ -2,7 +2,7 @@ from datetime import date, datetime
 from typing import TYPE_CHECKING, Optional
 
 import pydantic
-from marshmallow import EXCLUDE, Schema, ValidationError, fields, post_load, validate
+from marshmallow import EXCLUDE, Schema, fields, validate
 from pydantic import BaseModel
 from sqlalchemy import Column, DateTime, func
 from sqlmodel import Field, Relationship, SQLModel
@@ -16,7 +16,7 @@ if TYPE_CHECKING:
 
 class Company(SQLModel, table=True):
     id: Optional[str] = Field(default_factory=uuid_generator, primary_key=True)
-    name: str
+    name: str = Field(index=True)
     registration_number: str
     registration_date: date
     address: str
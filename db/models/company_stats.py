@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, func
+from sqlmodel import Field, SQLModel
+
+
+class CompanyStats(SQLModel, table=True):
+    __tablename__ = "company_stats"
+
+    company_id: str = Field(foreign_key="company.id", primary_key=True)
+    stats: dict = Field(sa_column=Column(JSON, nullable=False))
+
+    updated_at: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True), onupdate=func.now(), default=func.now()
+        )
+    )
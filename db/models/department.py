@@ -1,11 +1,11 @@
-from datetime import date, datetime
+from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
 import pydantic
-from marshmallow import EXCLUDE, Schema, ValidationError, fields, post_load, validate
+from marshmallow import EXCLUDE, Schema, fields, validate
 from pydantic import BaseModel
 from sqlalchemy import Column, DateTime, func
-from sqlmodel import Field, Relationship, SQLModel
+from sqlmodel import Field, SQLModel
 
 from utils.uuid_generator import uuid_generator
 
@@ -15,7 +15,7 @@ if TYPE_CHECKING:
 
 class Department(SQLModel, table=True):
     id: Optional[str] = Field(default_factory=uuid_generator, primary_key=True)
-    company_id: str = Field(foreign_key="company.id")
+    company_id: str = Field(foreign_key="company.id", index=True)
     name: str
 
     created_at: datetime = Field(
@@ -2,11 +2,12 @@ from datetime import date, datetime
 from typing import TYPE_CHECKING, Optional
 
 import pydantic
-from marshmallow import EXCLUDE, Schema, ValidationError, fields, post_load, validate
+from marshmallow import EXCLUDE, Schema, fields, validate, validates_schema
 from pydantic import BaseModel
 from sqlalchemy import Column, DateTime, func
 from sqlmodel import Field, Relationship, SQLModel
 
+from utils.frame_validator import check_date_order
 from utils.uuid_generator import uuid_generator
 
 if TYPE_CHECKING:
@@ -16,7 +17,7 @@ if TYPE_CHECKING:
 
 class Employee(SQLModel, table=True):
     id: Optional[str] = Field(default_factory=uuid_generator, primary_key=True)
-    name: str
+    name: str = Field(index=True)
 
     roles: list["Role"] = Relationship()
 
@@ -36,6 +37,14 @@ class EmployeeDTO(BaseModel):
     employee_name: str
 
 
+class EmployeeBulkDeleteDTO(BaseModel):
+    ids: list[str]
+
+
+class EmployeeBatchDTO(BaseModel):
+    ids: list[str]
+
+
 class NewEmployeeDTO(BaseModel):
     # employee
     employee_name: str
@@ -68,6 +77,7 @@ class EmployeeValidator(Schema):
 class NewEmployeeValidator(Schema):
     class Meta:
         unknown = EXCLUDE
+        date_order = ("start_date", "end_date")
 
     employee_name = fields.Str(
         required=True,
@@ -114,3 +124,7 @@ class NewEmployeeValidator(Schema):
         allow_none=True,
         error_messages={"required": "End date is required"},
     )
+
+    @validates_schema
+    def validate_date_order(self, data, **kwargs):
+        check_date_order(data, *self.Meta.date_order)
@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, LargeBinary, func
+from sqlmodel import Field, SQLModel
+
+
+class IdempotencyKey(SQLModel, table=True):
+    __tablename__ = "idempotency_key"
+
+    key: str = Field(primary_key=True)
+    request_hash: str
+    # status is empty while the first request is still running
+    status_code: Optional[int] = Field(default=None)
+    content_type: Optional[str] = Field(default=None)
+    body: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
+
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), default=func.now(), index=True)
+    )
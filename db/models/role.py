@@ -2,11 +2,12 @@ from datetime import date, datetime
 from typing import TYPE_CHECKING, Optional
 
 import pydantic
-from marshmallow import EXCLUDE, Schema, ValidationError, fields, post_load, validate
+from marshmallow import EXCLUDE, Schema, fields, validate, validates_schema
 from pydantic import BaseModel
-from sqlalchemy import Column, DateTime, func
+from sqlalchemy import Column, DateTime, Index, func
 from sqlmodel import Field, Relationship, SQLModel
 
+from utils.frame_validator import check_date_order
 from utils.uuid_generator import uuid_generator
 
 if TYPE_CHECKING:
@@ -15,16 +16,31 @@ if TYPE_CHECKING:
     from db.models.employee import Employee
 
 
-class Role(SQLModel, table=True):
+class RoleBase(SQLModel):
     id: Optional[str] = Field(default_factory=uuid_generator, primary_key=True)
-    employee_id: str = Field(foreign_key="employee.id")
+    employee_id: str = Field(foreign_key="employee.id", index=True)
     company_id: str = Field(foreign_key="company.id")
-    department_id: str = Field(foreign_key="department.id")
+    department_id: str = Field(foreign_key="department.id", index=True)
     name: str
     duties: str
     employee_company_id: Optional[str]
-    start_date: date
-    end_date: Optional[date]
+    start_date: date = Field(index=True)
+    end_date: Optional[date] = Field(index=True)
+
+
+class Role(RoleBase, table=True):
+    __table_args__ = (
+        # employment verification lookups
+        Index(
+            "ix_role_company_id_employee_company_id",
+            "company_id",
+            "employee_company_id",
+            "start_date",
+            "end_date",
+        ),
+        # point in time and headcount queries
+        Index("ix_role_company_id_start_date", "company_id", "start_date", "end_date"),
+    )
 
     employee: "Employee" = Relationship()
     company: "Company" = Relationship()
@@ -40,6 +56,49 @@ class Role(SQLModel, table=True):
     )
 
 
+class RoleArchive(RoleBase, table=True):
+    """
+    Roles that ended before the archive horizon, moved out of the role table
+    so its indexes only cover roles that are still read often
+    """
+
+    __tablename__ = "role_archive"
+    __table_args__ = (
+        # employment verification lookups
+        Index(
+            "ix_role_archive_company_id_employee_company_id",
+            "company_id",
+            "employee_company_id",
+            "start_date",
+            "end_date",
+        ),
+        # point in time queries
+        Index(
+            "ix_role_archive_company_id_start_date",
+            "company_id",
+            "start_date",
+            "end_date",
+        ),
+    )
+
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    updated_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+
+
+class RoleHistory(RoleBase, table=True):
+    """
+    Read only view over the role and role_archive tables, for reads that need
+    every role an employee ever held
+    """
+
+    __tablename__ = "role_history"
+    # created by a migration as a view, not a table
+    __table_args__ = {"info": {"is_view": True}}
+
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    updated_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+
+
 class RoleDTO(BaseModel):
     id: Optional[str] = pydantic.Field(default=None)
     employee_id: Optional[str] = pydantic.Field(default=None)
@@ -55,6 +114,7 @@ class RoleDTO(BaseModel):
 class RoleValidator(Schema):
     class Meta:
         unknown = EXCLUDE
+        date_order = ("start_date", "end_date")
 
     name = fields.Str(
         required=True,
@@ -113,3 +173,7 @@ class RoleValidator(Schema):
         allow_none=True,
         error_messages={"required": "End date is required"},
     )
+
+    @validates_schema
+    def validate_date_order(self, data, **kwargs):
+        check_date_order(data, *self.Meta.date_order)
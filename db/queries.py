@@ -0,0 +1,180 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import and_, func, lambda_stmt, or_, select, true
+
+from db.models.cache_version import CacheVersion
+from db.models.company import Company
+from db.models.department import Department
+from db.models.employee import Employee
+from db.models.role import Role, RoleHistory
+
+
+def role_overlaps(start: Optional[date], end: Optional[date], role=Role):
+    """
+    Filter roles held at any point between start and end (inclusive), a role
+    without an end date is ongoing. A missing bound leaves that side open.
+    :param start: first day of the period
+    :param end: last day of the period
+    :param role: Role or RoleHistory
+    :return: SQL expression
+    """
+
+    conditions = []
+
+    if end is not None:
+        conditions.append(role.start_date <= end)
+
+    if start is not None:
+        conditions.append(or_(role.end_date.is_(None), role.end_date >= start))
+
+    return and_(true(), *conditions)
+
+
+def role_active_on(day: date, role=Role):
+    """
+    Filter roles held on the given day, a role without an end date is ongoing
+    :param day: day to check
+    :param role: Role or RoleHistory
+    :return: SQL expression
+    """
+
+    return role_overlaps(day, day, role)
+
+
+# statements run on most requests, built once as lambda statements so later
+# calls skip constructing the statement and computing its cache key
+
+
+def company_by_id(company_id: str):
+    """
+    Select a company by id
+    :param company_id: company id
+    :return: statement
+    """
+
+    return lambda_stmt(lambda: select(Company).where(Company.id == company_id))
+
+
+def company_by_registration_number(registration_number: str):
+    """
+    Select a company by registration number
+    :param registration_number: registration number
+    :return: statement
+    """
+
+    return lambda_stmt(
+        lambda: select(Company).where(
+            Company.registration_number == registration_number
+        )
+    )
+
+
+def company_role_exists(company_id: str):
+    """
+    Select the id of any role at a company, archived ones included
+    :param company_id: company id
+    :return: statement
+    """
+
+    return lambda_stmt(
+        lambda: select(RoleHistory.id)
+        .where(RoleHistory.company_id == company_id)
+        .limit(1)
+    )
+
+
+def company_department_exists(company_id: str):
+    """
+    Select the id of any department of a company
+    :param company_id: company id
+    :return: statement
+    """
+
+    return lambda_stmt(
+        lambda: select(Department.id)
+        .where(Department.company_id == company_id)
+        .limit(1)
+    )
+
+
+def department_by_id(department_id: str):
+    """
+    Select a department by id
+    :param department_id: department id
+    :return: statement
+    """
+
+    return lambda_stmt(lambda: select(Department).where(Department.id == department_id))
+
+
+def department_company_id(department_id: str):
+    """
+    Select the company id of a department
+    :param department_id: department id
+    :return: statement
+    """
+
+    return lambda_stmt(
+        lambda: select(Department.company_id).where(Department.id == department_id)
+    )
+
+
+def department_role_exists(department_id: str):
+    """
+    Select the id of any role in a department, archived ones included
+    :param department_id: department id
+    :return: statement
+    """
+
+    return lambda_stmt(
+        lambda: select(RoleHistory.id)
+        .where(RoleHistory.department_id == department_id)
+        .limit(1)
+    )
+
+
+def employee_by_id(employee_id: str):
+    """
+    Select an employee by id
+    :param employee_id: employee id
+    :return: statement
+    """
+
+    return lambda_stmt(lambda: select(Employee).where(Employee.id == employee_id))
+
+
+def role_by_id(role_id: str):
+    """
+    Select a role by id
+    :param role_id: role id
+    :return: statement
+    """
+
+    return lambda_stmt(lambda: select(Role).where(Role.id == role_id))
+
+
+def employee_role_count(employee_id: str):
+    """
+    Count the roles of an employee, archived ones included
+    :param employee_id: employee id
+    :return: statement
+    """
+
+    return lambda_stmt(
+        lambda: select(func.count(RoleHistory.id)).where(
+            RoleHistory.employee_id == employee_id
+        )
+    )
+
+
+def cache_version(name: str):
+    """
+    Select the version of a cache
+    :param name: cache name
+    :return: statement
+    """
+
+    return lambda_stmt(
+        lambda: select(CacheVersion.version).where(CacheVersion.name == name)
+    )
@@ -0,0 +1,169 @@
+import threading
+from typing import Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from db.coalescer import write_main_database
+from db.engine import get_engine
+from db.models.cache_version import CacheVersion
+from db.models.company import Company
+from db.models.department import Department
+from db.queries import cache_version
+from db.shards import fan_out, home_shard
+
+NAMES = "names"
+
+
+class Names:
+    """
+    Snapshot of company and department names at one cache version
+    """
+
+    def __init__(
+        self,
+        version: int,
+        companies: dict,
+        departments: dict,
+        shards: Optional[dict] = None,
+    ):
+        self.version = version
+        self.companies = companies
+        self.company_ids = set(companies.values())
+        self.departments = departments
+        self.department_companies = {
+            department_id: company_id
+            for (company_id, _), department_id in departments.items()
+        }
+        self.shards = shards or {}
+
+    def company_id(self, name: str) -> Optional[str]:
+        """
+        Resolve a company name
+        :param name: company name
+        :return: company id, None if there is no such company
+        """
+
+        return self.companies.get(name)
+
+    def department_id(self, company_id: str, name: str) -> Optional[str]:
+        """
+        Resolve a department name within a company
+        :param company_id: company id
+        :param name: department name
+        :return: department id, None if the company has no such department
+        """
+
+        return self.departments.get((company_id, name))
+
+    def has_company(self, company_id: str) -> bool:
+        """
+        Check if a company exists
+        :param company_id: company id
+        :return: True if it exists
+        """
+
+        return company_id in self.company_ids
+
+    def shard(self, company_id: str) -> int:
+        """
+        Find the shard holding a company
+        :param company_id: company id
+        :return: shard number, the home shard of unknown companies
+        """
+
+        if company_id in self.shards:
+            return self.shards[company_id]
+
+        return home_shard(company_id)
+
+    def department_shard(self, department_id: str) -> int:
+        """
+        Find the shard holding a department, the shard of its company
+        :param department_id: department id
+        :return: shard number, the first shard for unknown departments
+        """
+
+        company_id = self.department_companies.get(department_id)
+
+        return self.shard(company_id) if company_id is not None else 0
+
+
+def bump_names_version(session: Session):
+    """
+    Invalidate cached names in every worker, call in the same transaction as
+    any write that creates, renames or deletes a company or department
+    :param session: session of the write
+    """
+
+    statement = insert(CacheVersion).values(name=NAMES, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CacheVersion.name],
+        set_={"version": CacheVersion.version + 1},
+    )
+
+    # the version lives in the main database
+    write_main_database(session, lambda session: session.execute(statement))
+
+
+class NameResolver:
+    """
+    In memory maps of company name to id and (company id, department name)
+    to id. Each lookup checks the version row in the database, so writes by
+    any worker are seen, and the maps are only reloaded after it changed.
+    """
+
+    def __init__(self):
+        self._names: Optional[Names] = None
+        self._lock = threading.Lock()
+
+    def names(self, session: Optional[Session] = None) -> Names:
+        """
+        Get the current names
+        :param session: session to read with, a new one if not given
+        :return: names
+        """
+
+        if session is None:
+            with Session(get_engine()) as session:
+                return self.names(session)
+
+        version = session.scalars(cache_version(NAMES)).one_or_none() or 0
+
+        # names newer than the version read are fine, e.g. on the read snapshot
+        names = self._names
+        if names is not None and names.version >= version:
+            return names
+
+        with self._lock:
+            if self._names is not None and self._names.version >= version:
+                return self._names
+
+            # read in the same transaction as the version, or after it on
+            # each shard
+            def load(session: Session) -> tuple:
+                companies = session.exec(select(Company.name, Company.id)).all()
+                departments = session.exec(
+                    select(Department.company_id, Department.name, Department.id)
+                ).all()
+
+                return companies, departments
+
+            companies, departments, shards = {}, {}, {}
+
+            for shard, (shard_companies, shard_departments) in enumerate(
+                fan_out(load, session)
+            ):
+                companies.update(shard_companies)
+                shards.update((company_id, shard) for _, company_id in shard_companies)
+                departments.update(
+                    ((company_id, name), department_id)
+                    for company_id, name, department_id in shard_departments
+                )
+
+            self._names = Names(version, companies, departments, shards)
+
+            return self._names
+
+
+name_resolver = NameResolver()
@@ -0,0 +1,16 @@
+from sqlmodel import Session
+
+
+def fetch_dicts(session: Session, statement) -> list:
+    """
+    Run a select of columns and return each row as a dict, skips building
+    model instances for read only output
+    :param session: database session
+    :param statement: select of columns e.g. select(Company.id, Company.name)
+    :return: rows
+    """
+
+    result = session.execute(statement)
+    keys = tuple(result.keys())
+
+    return [dict(zip(keys, row)) for row in result]
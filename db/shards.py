@@ -0,0 +1,294 @@
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, TypeVar
+
+from sqlalchemy import Engine, insert
+from sqlmodel import Session, delete, func, select
+
+import config
+from db.coalescer import WriteCoalescer, write_coalescer
+from db.engine import get_engine, get_shard_engine
+from db.models.company import Company
+from db.models.company_stats import CompanyStats
+from db.models.department import Department
+from db.models.role import Role, RoleArchive, RoleHistory
+
+T = TypeVar("T")
+
+# tables holding the rows of a company in its shard, parents first
+COMPANY_TABLES = [Company, Department, Role, RoleArchive, CompanyStats]
+
+_coalescers: dict[int, WriteCoalescer] = {}
+_coalescers_lock = threading.Lock()
+# reads and writes get their own threads, writer threads waiting on
+# write_shards must never hold up the reads writer jobs fan out
+_executors: dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def sharded() -> bool:
+    """
+    Check if companies are spread over shard databases
+    :return: True if sharding is on
+    """
+
+    return config.SHARD_COUNT > 0
+
+
+def shards() -> range:
+    """
+    Get the shard numbers, a single shard, the main database, when sharding
+    is off
+    :return: shard numbers
+    """
+
+    return range(max(config.SHARD_COUNT, 1))
+
+
+def other_shards(shard: int) -> list:
+    """
+    Get the shard numbers except one
+    :param shard: shard to leave out
+    :return: shard numbers
+    """
+
+    return [other for other in shards() if other != shard]
+
+
+def home_shard(company_id: str) -> int:
+    """
+    Get the shard a company is created in, companies are spread by a hash of
+    their id and only leave it when rebalanced
+    :param company_id: company id
+    :return: shard number
+    """
+
+    if not sharded():
+        return 0
+
+    return zlib.crc32(company_id.encode()) % config.SHARD_COUNT
+
+
+def company_shard(company_id: str) -> int:
+    """
+    Find the shard holding a company
+    :param company_id: company id
+    :return: shard number, the home shard of unknown companies
+    """
+
+    if not sharded():
+        return 0
+
+    from db.resolver import name_resolver
+
+    return name_resolver.names().shard(company_id)
+
+
+def department_shard(department_id: str) -> int:
+    """
+    Find the shard holding a department
+    :param department_id: department id
+    :return: shard number, the first shard for unknown departments
+    """
+
+    if not sharded():
+        return 0
+
+    from db.resolver import name_resolver
+
+    return name_resolver.names().department_shard(department_id)
+
+
+def role_shard(role_id: str) -> Optional[int]:
+    """
+    Find the shard holding a role, archived or not
+    :param role_id: role id
+    :return: shard number, None if no shard has it
+    """
+
+    if not sharded():
+        return 0
+
+    statement = select(RoleHistory.id).where(RoleHistory.id == role_id)
+    found = fan_out(lambda session: session.exec(statement).first() is not None)
+
+    return found.index(True) if True in found else None
+
+
+def shard_engine(shard: int) -> Engine:
+    """
+    Get the engine of a shard
+    :param shard: shard number
+    :return: engine, the shared engine when sharding is off
+    """
+
+    if not sharded():
+        return get_engine()
+
+    return get_shard_engine(shard)
+
+
+def shard_coalescer(shard: int) -> WriteCoalescer:
+    """
+    Get the writer of a shard, created on first use
+    :param shard: shard number
+    :return: write coalescer, the shared one when sharding is off
+    """
+
+    if not sharded():
+        return write_coalescer
+
+    with _coalescers_lock:
+        if shard not in _coalescers:
+            _coalescers[shard] = WriteCoalescer(shard=shard)
+
+        return _coalescers[shard]
+
+
+def stop_shard_coalescers():
+    """
+    Commit everything queued for the shards and stop their writer threads
+    """
+
+    with _coalescers_lock:
+        coalescers = list(_coalescers.values())
+
+    for coalescer in coalescers:
+        coalescer.stop()
+
+
+def _map(function: Callable, items: list, kind: str) -> list:
+    # nothing to run alongside
+    if len(items) < 2:
+        return [function(item) for item in items]
+
+    with _executors_lock:
+        if kind not in _executors:
+            _executors[kind] = ThreadPoolExecutor(
+                max_workers=max(config.SHARD_COUNT, 1) * config.DB_POOL_SIZE,
+                thread_name_prefix=f"shard-{kind}",
+            )
+
+    return list(_executors[kind].map(function, items))
+
+
+def fan_out(
+    job: Callable[[Session], T],
+    session: Optional[Session] = None,
+    on: Optional[Iterable[int]] = None,
+) -> list[T]:
+    """
+    Run a read on several shards in parallel, each in its own session
+    :param job: function taking a session
+    :param session: session to run the job with when sharding is off
+    :param on: shard numbers, all shards if not given
+    :return: result of the job on each shard, in shard order
+    """
+
+    on = list(shards() if on is None else on)
+
+    if not sharded() and session is not None:
+        return [job(session) for _ in on]
+
+    def run(shard: int) -> T:
+        with Session(shard_engine(shard)) as session:
+            return job(session)
+
+    return _map(run, on, "read")
+
+
+def write_shards(jobs: dict[int, Callable[[Session], T]]) -> dict[int, T]:
+    """
+    Run writes on several shards in parallel, each shard commits on its own
+    so one failing leaves the others committed
+    :param jobs: functions taking a session, by shard number
+    :return: result of each job by shard number
+    """
+
+    shard_numbers = list(jobs)
+    results = _map(
+        lambda shard: shard_coalescer(shard).run(jobs[shard]), shard_numbers, "write"
+    )
+
+    return dict(zip(shard_numbers, results))
+
+
+def _company_rows(model: type, company_id: str):
+    # companies are keyed by their id, the other tables refer to it
+    column = model.id if model is Company else model.company_id
+
+    return model.__table__, column == company_id
+
+
+def move_company(company_id: str, source: Engine, target: Engine) -> dict:
+    """
+    Move a company with its departments, roles and stats to another database.
+    Writes to the source wait until the move is done, requests find the
+    company in the target once the names version is bumped.
+    :param company_id: company id
+    :param source: engine of the database holding the company
+    :param target: engine of the database to move it to
+    :return: number of rows moved per table
+    """
+
+    from db.resolver import bump_names_version
+
+    main = get_engine(primary=True)
+    immediate = {"sqlite_begin": "BEGIN IMMEDIATE"}
+    moved = {}
+
+    # hold the source lock from the first read to the delete, so nothing is
+    # written to the company half way through
+    with Session(source.execution_options(**immediate)) as source_session:
+        with Session(target.execution_options(**immediate)) as target_session:
+            for model in COMPANY_TABLES:
+                table, where = _company_rows(model, company_id)
+                rows = source_session.execute(select(table).where(where)).mappings()
+                rows = [dict(row) for row in rows]
+
+                if rows:
+                    target_session.execute(insert(table), rows)
+
+                moved[table.name] = len(rows)
+
+            if target is main:
+                bump_names_version(target_session)
+
+            target_session.commit()
+
+        for model in reversed(COMPANY_TABLES):
+            table, where = _company_rows(model, company_id)
+            source_session.execute(delete(table).where(where))
+
+        # reroute requests before the source lets go of the company
+        if source is main:
+            bump_names_version(source_session)
+        elif target is not main:
+            with Session(main) as session:
+                bump_names_version(session)
+                session.commit()
+
+        source_session.commit()
+
+    return moved
+
+
+def company_sizes(engine: Engine) -> dict:
+    """
+    Count the roles of each company in a database, archived ones included
+    :param engine: engine of the main database or a shard
+    :return: number of roles by company id
+    """
+
+    with Session(engine) as session:
+        sizes = dict.fromkeys(session.exec(select(Company.id)).all(), 0)
+        statement = select(RoleHistory.company_id, func.count()).group_by(
+            RoleHistory.company_id
+        )
+
+        for company_id, roles in session.exec(statement):
+            if company_id in sizes:
+                sizes[company_id] = roles
+
+    return sizes
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Optional
+
+from sqlalchemy import Engine
+
+import config
+from db.backup import backup_database
+from db.engine import create_read_only_engine, get_engine
+from utils.lock_file import lock_owner, release_lock, take_lock
+from utils.metrics import metrics
+
+
+class ReadSnapshot:
+    """
+    Read only copy of the database that GET requests query, so reads do not
+    share the primary with writers. One worker per host refreshes the copy,
+    the others read the copy it points them to, so a host keeps two copies
+    however many workers it runs. The older copy is overwritten on each
+    refresh, requests still reading the newer one are not disturbed. The
+    copy is only taken again when the primary has changed, a few pages at a
+    time.
+    """
+
+    def __init__(
+        self,
+        interval: float = config.READ_SNAPSHOT_INTERVAL,
+        max_staleness: float = config.READ_SNAPSHOT_MAX_STALENESS,
+    ):
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self._engine: Optional[Engine] = None
+        self._generation: Optional[int] = None
+        self._taken_at = 0.0
+        self._prefix = ""
+        self._watch: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, directory: str = config.READ_SNAPSHOT_DIR):
+        """
+        Take or pick up the first snapshot and keep it fresh in the background
+        :param directory: directory for the copies, the temp dir if empty
+        """
+
+        directory = directory or tempfile.gettempdir()
+        primary = os.path.abspath(get_engine(primary=True).url.database)
+
+        # workers of the same database share the copies
+        digest = hashlib.sha256(primary.encode()).hexdigest()[:12]
+        self._prefix = os.path.join(directory, f"talent_verify.snapshot-{digest}")
+
+        self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """
+        Stop refreshing, the copies stay for the other workers
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+            self._generation = None
+
+        if self._watch is not None:
+            self._watch.close()
+            self._watch = None
+            self._data_version = None
+            # another worker takes over
+            release_lock(self._prefix + ".lock")
+
+    def refresh(self):
+        """
+        Refresh the copy if this worker is the one taking them, then switch
+        to the newest copy
+        """
+
+        lock_path = self._prefix + ".lock"
+
+        if lock_owner(lock_path) == os.getpid() or take_lock(lock_path):
+            self._copy()
+
+        self._follow()
+
+    def _copy(self):
+        if self._watch is None:
+            # sees commits of every connection but its own, and never writes
+            self._watch = sqlite3.connect(
+                get_engine(primary=True).url.database, check_same_thread=False
+            )
+
+        start = time.time()
+        pointer = self._pointer() or {"generation": -1}
+
+        # read before copying, a commit in between only costs another copy
+        data_version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+        if data_version == self._data_version:
+            # the copy is still current
+            self._point(dict(pointer, taken_at=start))
+            metrics.increment("snapshot_refresh_skipped")
+            return
+
+        generation = pointer["generation"] + 1
+        path = f"{self._prefix}-{generation % 2}.db"
+
+        # consistent copy paced like an online backup, so it does not crowd
+        # out the writers
+        backup_database(path)
+
+        # the copy is as old as the moment the backup started
+        self._point({"generation": generation, "path": path, "taken_at": start})
+        self._data_version = data_version
+
+        metrics.observe("snapshot_refresh_ms", (time.time() - start) * 1000)
+
+    def _pointer(self) -> Optional[dict]:
+        try:
+            with open(self._prefix + ".json") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _point(self, pointer: dict):
+        # replaced in one go, readers never see half a file
+        path = self._prefix + ".json"
+
+        with open(path + ".partial", "w") as file:
+            json.dump(pointer, file)
+
+        os.replace(path + ".partial", path)
+
+    def _follow(self):
+        pointer = self._pointer()
+
+        if pointer is None:
+            return
+
+        if pointer["generation"] != self._generation:
+            previous = self._engine
+            self._engine = create_read_only_engine(pointer["path"])
+            self._generation = pointer["generation"]
+
+            # connections still in use close when they are returned
+            if previous is not None:
+                previous.dispose()
+
+        self._taken_at = pointer["taken_at"]
+
+    def age(self) -> float:
+        """
+        Seconds since the snapshot was taken
+        :return: age
+        """
+
+        return time.time() - self._taken_at
+
+    def engine(self) -> Optional[Engine]:
+        """
+        Get the engine of the snapshot
+        :return: engine, None if there is no snapshot within the staleness bound
+        """
+
+        if self._engine is None or self.age() > self.max_staleness:
+            return None
+
+        return self._engine
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await asyncio.to_thread(self.refresh)
+            except (sqlite3.Error, OSError):
+                # still reading the older copy, reads fall back to the
+                # primary once the snapshot gets too stale
+                metrics.increment("snapshot_refresh_failures")
+
+
+read_snapshot = ReadSnapshot()
@@ -0,0 +1,324 @@
+import copy
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import case, func
+from sqlmodel import Session, delete, select
+
+from db.models.company_stats import CompanyStats
+from db.models.department import Department
+from db.models.role import Role, RoleHistory
+
+
+def compute_company_stats(session: Session, company_id: str) -> dict:
+    """
+    Aggregate the workforce statistics of a company from its roles.
+    Tenure is stored as sums so the average can be taken on any day.
+    :param session: database session
+    :param company_id: company id
+    :return: stats
+    """
+
+    # one row per employee who has worked at the company, archived roles
+    # included
+    employees = (
+        select(
+            RoleHistory.employee_id,
+            func.min(RoleHistory.start_date).label("first_start"),
+            func.max(RoleHistory.end_date).label("last_end"),
+            func.sum(case((RoleHistory.end_date.is_(None), 1), else_=0)).label(
+                "open_roles"
+            ),
+        )
+        .where(RoleHistory.company_id == company_id)
+        .group_by(RoleHistory.employee_id)
+        .subquery()
+    )
+    is_current = employees.c.open_roles > 0
+
+    statement = select(
+        func.count(case((is_current, 1))),
+        func.count(case((~is_current, 1))),
+        func.sum(
+            case(
+                (
+                    ~is_current,
+                    func.julianday(employees.c.last_end)
+                    - func.julianday(employees.c.first_start),
+                )
+            )
+        ),
+        func.sum(case((is_current, func.julianday(employees.c.first_start)))),
+    )
+    current, former, closed_days, open_start_days = session.exec(statement).one()
+
+    hire_year = func.strftime("%Y", employees.c.first_start)
+    statement = select(hire_year, func.count()).group_by(hire_year)
+    hires = session.exec(statement).all()
+
+    leave_year = func.strftime("%Y", employees.c.last_end)
+    statement = select(leave_year, func.count()).where(~is_current).group_by(leave_year)
+    leavers = session.exec(statement).all()
+
+    statement = (
+        select(
+            Department.id,
+            Department.name,
+            func.count(Role.employee_id.distinct()),
+        )
+        .join(Role, Role.department_id == Department.id)
+        .where(Role.company_id == company_id, Role.end_date.is_(None))
+        .group_by(Department.id, Department.name)
+    )
+    departments = session.exec(statement).all()
+
+    return {
+        "headcount_by_department": [
+            {"department_id": id, "name": name, "headcount": headcount}
+            for id, name, headcount in departments
+        ],
+        "current_employees": current,
+        "former_employees": former,
+        "tenure": {
+            "closed_count": former,
+            "closed_days": closed_days or 0,
+            "open_count": current,
+            "open_start_days": open_start_days or 0,
+        },
+        "hires_by_year": dict(hires),
+        "leavers_by_year": dict(leavers),
+    }
+
+
+def refresh_company_stats(session: Session, company_ids: Iterable[str]):
+    """
+    Recompute the stored stats of the given companies from all their roles,
+    for companies without stored stats. Role writes use company_stats_delta
+    instead, which does not read the whole history.
+    :param session: database session
+    :param company_ids: company ids
+    """
+
+    for company_id in set(company_ids):
+        stats = compute_company_stats(session, company_id)
+        company_stats = session.get(CompanyStats, company_id)
+
+        if company_stats is None:
+            session.add(CompanyStats(company_id=company_id, stats=stats))
+        else:
+            company_stats.stats = stats
+            session.add(company_stats)
+
+
+def _julian_day(day: date) -> float:
+    # same as sqlite's julianday() of a date
+    return day.toordinal() + 1721424.5
+
+
+def employee_stats(session: Session, company_id: str, employee_ids: list) -> dict:
+    """
+    Get what some employees add to the stats of a company, the same per
+    employee figures compute_company_stats aggregates
+    :param session: database session
+    :param company_id: company id
+    :param employee_ids: employee ids
+    :return: figures by employee id, employees without roles at the company
+    are left out
+    """
+
+    statement = (
+        select(
+            RoleHistory.employee_id,
+            func.min(RoleHistory.start_date),
+            func.max(RoleHistory.end_date),
+            func.sum(case((RoleHistory.end_date.is_(None), 1), else_=0)),
+        )
+        .where(
+            RoleHistory.company_id == company_id,
+            RoleHistory.employee_id.in_(employee_ids),
+        )
+        .group_by(RoleHistory.employee_id)
+    )
+    employees = {
+        employee_id: {
+            "first_start": first_start,
+            "last_end": last_end,
+            "current": open_roles > 0,
+            "departments": {},
+        }
+        for employee_id, first_start, last_end, open_roles in session.exec(statement)
+    }
+
+    statement = (
+        select(Role.employee_id, Department.id, Department.name)
+        .join(Department, Role.department_id == Department.id)
+        .where(
+            Role.company_id == company_id,
+            Role.employee_id.in_(employee_ids),
+            Role.end_date.is_(None),
+        )
+        .distinct()
+    )
+    for employee_id, department_id, name in session.exec(statement):
+        employees[employee_id]["departments"][department_id] = name
+
+    return employees
+
+
+def _add_employee(stats: dict, employee: dict, sign: int):
+    # add an employee's figures to the stats, or take them out with sign -1
+    tenure = stats["tenure"]
+    hire_year = f"{employee['first_start'].year:04d}"
+    stats["hires_by_year"][hire_year] = stats["hires_by_year"].get(hire_year, 0) + sign
+
+    if employee["current"]:
+        stats["current_employees"] += sign
+        tenure["open_count"] += sign
+        tenure["open_start_days"] += sign * _julian_day(employee["first_start"])
+    else:
+        leave_year = f"{employee['last_end'].year:04d}"
+        leavers = stats["leavers_by_year"]
+        leavers[leave_year] = leavers.get(leave_year, 0) + sign
+
+        stats["former_employees"] += sign
+        tenure["closed_count"] += sign
+        tenure["closed_days"] += sign * (
+            _julian_day(employee["last_end"]) - _julian_day(employee["first_start"])
+        )
+
+    departments = {
+        department["department_id"]: department
+        for department in stats["headcount_by_department"]
+    }
+    for department_id, name in employee["departments"].items():
+        department = departments.setdefault(
+            department_id,
+            {"department_id": department_id, "name": name, "headcount": 0},
+        )
+        department["headcount"] += sign
+
+    stats["headcount_by_department"] = sorted(
+        departments.values(), key=lambda department: department["department_id"]
+    )
+
+
+def _drop_empty(stats: dict):
+    # compute_company_stats leaves out years and departments without anyone
+    for key in ["hires_by_year", "leavers_by_year"]:
+        stats[key] = {
+            year: count for year, count in sorted(stats[key].items()) if count
+        }
+
+    stats["headcount_by_department"] = [
+        department
+        for department in stats["headcount_by_department"]
+        if department["headcount"]
+    ]
+
+
+@contextmanager
+def company_stats_delta(session: Session, employees: Iterable[tuple[str, str]]):
+    """
+    Update the stored stats of companies for changes to the roles of some of
+    their employees made inside the block. Only the figures of those
+    employees are read, before and after the block, so the cost does not grow
+    with the size of the company. Stats missing altogether are computed in
+    full.
+    :param session: database session
+    :param employees: (company id, employee id) of every employee whose roles
+    at the company change
+    """
+
+    companies = defaultdict(set)
+    for company_id, employee_id in employees:
+        companies[company_id].add(employee_id)
+
+    before = {
+        company_id: employee_stats(session, company_id, list(employee_ids))
+        for company_id, employee_ids in companies.items()
+    }
+
+    yield
+
+    session.flush()
+
+    for company_id, employee_ids in companies.items():
+        company_stats = session.get(CompanyStats, company_id)
+
+        if company_stats is None:
+            refresh_company_stats(session, [company_id])
+            continue
+
+        after = employee_stats(session, company_id, list(employee_ids))
+
+        # a copy, so the change to the json column is noticed
+        stats = copy.deepcopy(company_stats.stats)
+
+        for employee in before[company_id].values():
+            _add_employee(stats, employee, -1)
+
+        for employee in after.values():
+            _add_employee(stats, employee, 1)
+
+        _drop_empty(stats)
+        company_stats.stats = stats
+        session.add(company_stats)
+
+
+def rename_department_in_stats(
+    session: Session, company_id: str, department_id: str, name: str
+):
+    """
+    Update the department name in the stored stats of its company
+    :param session: database session
+    :param company_id: company id
+    :param department_id: department id
+    :param name: new department name
+    """
+
+    company_stats = session.get(CompanyStats, company_id)
+
+    if company_stats is None:
+        return
+
+    stats = copy.deepcopy(company_stats.stats)
+
+    for department in stats["headcount_by_department"]:
+        if department["department_id"] == department_id:
+            department["name"] = name
+
+    company_stats.stats = stats
+    session.add(company_stats)
+
+
+def delete_company_stats(session: Session, company_id: str):
+    """
+    Remove the stored stats of a company
+    :param session: database session
+    :param company_id: company id
+    """
+
+    session.execute(delete(CompanyStats).where(CompanyStats.company_id == company_id))
+
+
+def average_tenure_days(stats: dict, day: date) -> float | None:
+    """
+    Average number of days employees have spent at the company as of a day
+    :param stats: stored company stats
+    :param day: day to compute the tenure on
+    :return: average tenure in days, None if the company has no employees
+    """
+
+    tenure = stats["tenure"]
+    count = tenure["closed_count"] + tenure["open_count"]
+
+    if count == 0:
+        return None
+
+    # julian day number of the given day
+    julian_day = day.toordinal() + 1721424.5
+    open_days = tenure["open_count"] * julian_day - tenure["open_start_days"]
+
+    return round((tenure["closed_days"] + open_days) / count, 1)
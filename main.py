@@ -1,22 +1,189 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+from contextlib import asynccontextmanager
 
-from api import company, department, employee, role
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from sqlmodel import Session
 
-app = FastAPI()
-app.include_router(company.router)
-app.include_router(department.router)
-app.include_router(employee.router)
-app.include_router(role.router)
+import config
+from api import admin, changes, company, department, employee, role, verify
+from db.archive import archive_cutoff, archive_roles
+from db.changes import compact_changes, latest_cursor, read_changes
+from db.coalescer import write_coalescer
+from db.engine import (
+    check_schema_version,
+    dispose_engine,
+    get_engine,
+    init_engine,
+    warm_up,
+)
+from db.idempotency import purge_keys
+from db.shards import (
+    shard_coalescer,
+    shard_engine,
+    sharded,
+    shards,
+    stop_shard_coalescers,
+)
+from db.snapshot import read_snapshot
+from utils.admission import Overloaded, overloaded_response, size_threadpool
+from utils.broadcaster import change_stream
+from utils.idempotency import IdempotencyMiddleware
+from utils.read_snapshot import ReadSnapshotMiddleware
+from utils.request_timer import RequestTimerMiddleware
 
 origins = [
     "http://localhost:3000",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+async def compact_change_log():
+    def compact(session):
+        return compact_changes(session, config.CHANGE_LOG_MAX_ROWS)
+
+    while True:
+        await asyncio.sleep(config.CHANGE_LOG_COMPACT_INTERVAL)
+
+        try:
+            await asyncio.to_thread(write_coalescer.run, compact)
+        except Overloaded:
+            # busy, try again next time
+            pass
+
+
+async def purge_idempotency_keys():
+    def purge(session):
+        return purge_keys(session, config.IDEMPOTENCY_TTL, config.IDEMPOTENCY_MAX_KEYS)
+
+    while True:
+        await asyncio.sleep(config.IDEMPOTENCY_PURGE_INTERVAL)
+
+        try:
+            await asyncio.to_thread(write_coalescer.run, purge)
+        except Overloaded:
+            # busy, try again next time
+            pass
+
+
+async def archive_ended_roles():
+    def archive(session):
+        return archive_roles(session, cutoff, config.ROLE_ARCHIVE_BATCH_SIZE)
+
+    while True:
+        await asyncio.sleep(config.ROLE_ARCHIVE_INTERVAL)
+
+        cutoff = archive_cutoff()
+        if cutoff is None:
+            continue
+
+        for shard in shards():
+            coalescer = shard_coalescer(shard)
+
+            try:
+                # a batch per transaction so other writes get their turn
+                while (
+                    await asyncio.to_thread(coalescer.run, archive)
+                    == config.ROLE_ARCHIVE_BATCH_SIZE
+                ):
+                    pass
+            except Overloaded:
+                # busy, try again next time
+                pass
+
+
+async def tail_change_log():
+    # one tailer per worker, so writes made by any worker reach every stream
+    def read(cursor):
+        with Session(get_engine()) as session:
+            # nobody is listening yet, skip ahead
+            if cursor is None or not change_stream.subscriber_count():
+                return [], latest_cursor(session)
+
+            changes = read_changes(session, cursor, config.CHANGE_STREAM_BUFFER_SIZE)
+            return changes, changes[-1]["cursor"] if changes else cursor
+
+    cursor = None
+
+    while True:
+        changes, cursor = await asyncio.to_thread(read, cursor)
+
+        for change in changes:
+            change_stream.publish(change)
+
+        await asyncio.sleep(config.CHANGE_STREAM_POLL_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # per worker setup
+    size_threadpool()
+    engine = init_engine()
+
+    if config.CHECK_SCHEMA_VERSION:
+        check_schema_version(engine)
+
+    warm_up(engine)
+    write_coalescer.start()
+
+    if sharded():
+        for shard in shards():
+            if config.CHECK_SCHEMA_VERSION:
+                check_schema_version(
+                    shard_engine(shard), "python manage.py migrate-shards"
+                )
+
+            warm_up(shard_engine(shard))
+            shard_coalescer(shard).start()
+
+    if config.READ_SNAPSHOT:
+        read_snapshot.start()
+
+    compaction = asyncio.create_task(compact_change_log())
+    tailer = asyncio.create_task(tail_change_log())
+    purger = asyncio.create_task(purge_idempotency_keys())
+    archiver = asyncio.create_task(archive_ended_roles())
+
+    yield
+
+    # per worker teardown
+    compaction.cancel()
+    tailer.cancel()
+    purger.cancel()
+    archiver.cancel()
+    read_snapshot.stop()
+    # shard writers finish with writes to the main database
+    stop_shard_coalescers()
+    write_coalescer.stop()
+    dispose_engine()
+
+
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return overloaded_response(exc)
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(company.router)
+    app.include_router(department.router)
+    app.include_router(employee.router)
+    app.include_router(role.router)
+    app.include_router(verify.router)
+    app.include_router(changes.router)
+    app.include_router(admin.router)
+    app.add_exception_handler(Overloaded, overloaded_handler)
+    app.add_middleware(IdempotencyMiddleware)
+    app.add_middleware(ReadSnapshotMiddleware)
+    app.add_middleware(RequestTimerMiddleware)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,223 @@
+import os
+from typing import Optional
+
+import typer
+import uvicorn
+
+import config
+
+cli = typer.Typer()
+
+
+@cli.callback()
+def main():
+    """
+    Talent verify management commands
+    """
+
+
+@cli.command()
+def serve(
+    host: str = "0.0.0.0",
+    port: int = 8000,
+    workers: int = config.WEB_CONCURRENCY,
+):
+    """
+    Run the api with one worker process per core
+    """
+
+    uvicorn.run(
+        "main:create_app",
+        factory=True,
+        host=host,
+        port=port,
+        workers=workers,
+    )
+
+
+@cli.command()
+def backup(
+    path: str,
+    compress: bool = False,
+    pages: int = config.BACKUP_STEP_PAGES,
+    pause: float = config.BACKUP_STEP_PAUSE,
+    shard: Optional[int] = typer.Option(None, help="Back up a shard database"),
+):
+    """
+    Back up the database while the api keeps serving requests
+    """
+
+    from db.backup import backup_database
+    from db.engine import shard_path
+
+    def progress(copied: int, total: int):
+        typer.echo(f"\r{copied}/{total} pages", nl=False)
+
+    source = shard_path(shard) if shard is not None else None
+    report = backup_database(path, compress, pages, pause, progress, source)
+
+    typer.echo(
+        f"\nWrote {report['path']} ({report['size']} bytes) "
+        f"in {report['duration_ms'] / 1000:.1f}s"
+    )
+
+
+@cli.command()
+def duplicates(
+    output: typer.FileTextWrite = typer.Option("-", help="CSV file, - for stdout"),
+    min_score: float = config.DUPLICATE_MIN_SCORE,
+    reindex: bool = typer.Option(False, help="Rebuild the blocking keys first"),
+):
+    """
+    Write the likely duplicate employees of the whole table as CSV
+    """
+
+    import csv
+
+    from sqlmodel import Session
+
+    from db import get_engine
+    from db.duplicates import find_all_duplicates, rebuild_blocking_keys
+
+    engine = get_engine()
+
+    if reindex:
+        count = rebuild_blocking_keys(engine)
+        typer.echo(f"Indexed {count} employees", err=True)
+
+    writer = csv.writer(output)
+    writer.writerow(["employee_id", "duplicate_id", "score", "reasons"])
+
+    with Session(engine) as session:
+        for employee_id, duplicate_id, score, reasons in find_all_duplicates(
+            session, min_score
+        ):
+            writer.writerow([employee_id, duplicate_id, score, "; ".join(reasons)])
+
+
+@cli.command()
+def archive_roles(
+    horizon_days: int = config.ROLE_ARCHIVE_HORIZON_DAYS,
+    batch_size: int = config.ROLE_ARCHIVE_BATCH_SIZE,
+):
+    """
+    Move roles that ended more than horizon days ago to the role archive
+    """
+
+    from datetime import date, timedelta
+
+    from sqlmodel import Session
+
+    from db.archive import archive_roles as archive
+    from db.shards import shard_engine, shards
+
+    # a horizon of 0 turns archiving off, it would archive every ended role
+    if horizon_days <= 0:
+        typer.echo(
+            "Archiving is turned off, the horizon must be at least 1 day", err=True
+        )
+        raise typer.Exit(1)
+
+    cutoff = date.today() - timedelta(days=horizon_days)
+    archived = 0
+
+    for shard in shards():
+        engine = shard_engine(shard)
+
+        while True:
+            with Session(engine) as session:
+                moved = archive(session, cutoff, batch_size)
+                session.commit()
+
+            archived += moved
+
+            if moved < batch_size:
+                break
+
+    typer.echo(f"Archived {archived} roles that ended before {cutoff}")
+
+
+@cli.command()
+def migrate_shards():
+    """
+    Bring the shard databases to the latest migration and move the companies
+    still in the main database to their home shard
+    """
+
+    from alembic import command
+    from alembic.config import Config
+
+    from db import get_engine
+    from db.engine import get_shard_engine, shard_path
+    from db.shards import company_sizes, home_shard, move_company, sharded, shards
+
+    if not sharded():
+        typer.echo("Sharding is off, set SHARD_COUNT first", err=True)
+        raise typer.Exit(1)
+
+    for shard in shards():
+        os.makedirs(os.path.dirname(shard_path(shard)), exist_ok=True)
+
+        alembic_config = Config("alembic.ini")
+        alembic_config.set_main_option(
+            "sqlalchemy.url", f"sqlite:///{shard_path(shard)}"
+        )
+        command.upgrade(alembic_config, "head")
+
+    engine = get_engine()
+
+    for company_id in company_sizes(engine):
+        shard = home_shard(company_id)
+        moved = move_company(company_id, engine, get_shard_engine(shard))
+        typer.echo(f"Moved company {company_id} to shard {shard}: {moved}")
+
+
+@cli.command()
+def rebalance(
+    company_id: Optional[str] = typer.Argument(None),
+    shard: Optional[int] = typer.Option(
+        None, help="Shard to move to, the one with the fewest roles if not given"
+    ),
+):
+    """
+    Show the companies and roles of each shard, or move a company to another
+    shard. Run while the company is not being written to.
+    """
+
+    from db.engine import get_shard_engine
+    from db.resolver import name_resolver
+    from db.shards import company_sizes, move_company, sharded, shards
+
+    if not sharded():
+        typer.echo("Sharding is off, set SHARD_COUNT first", err=True)
+        raise typer.Exit(1)
+
+    sizes = {shard: company_sizes(get_shard_engine(shard)) for shard in shards()}
+
+    if company_id is None:
+        for shard, companies in sizes.items():
+            typer.echo(
+                f"shard {shard}: {len(companies)} companies, "
+                f"{sum(companies.values())} roles"
+            )
+        return
+
+    names = name_resolver.names()
+    if not names.has_company(company_id):
+        typer.echo(f"Company {company_id} does not exist", err=True)
+        raise typer.Exit(1)
+
+    source = names.shard(company_id)
+    if shard is None:
+        shard = min(sizes, key=lambda shard: sum(sizes[shard].values()))
+
+    if shard == source:
+        typer.echo(f"Company {company_id} is on shard {shard} already")
+        return
+
+    moved = move_company(company_id, get_shard_engine(source), get_shard_engine(shard))
+    typer.echo(f"Moved company {company_id} from shard {source} to {shard}: {moved}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+import anyio.to_thread
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+import config
+from utils.metrics import metrics
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is turned away because the worker is at capacity
+    """
+
+    def __init__(
+        self,
+        detail: str,
+        status_code: int = 503,
+        retry_after: int = config.RETRY_AFTER_SECONDS,
+    ):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def overloaded_response(exc: Overloaded) -> JSONResponse:
+    """
+    Build the response for a request turned away under load
+    :param exc: the rejection
+    :return: response with a Retry-After header
+    """
+
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of requests each route handles at once in this worker,
+    requests over the limit are rejected straight away instead of queueing.
+    Writes are also capped across all routes, as each one holds a thread of
+    the shared threadpool while it waits for the writer.
+    """
+
+    def __init__(self, read_limit: int, write_limit: int, worker_write_limit: int):
+        self.read_limit = read_limit
+        self.write_limit = write_limit
+        self.worker_write_limit = worker_write_limit
+        self._in_flight = defaultdict(int)
+        self._writes = 0
+
+    async def __call__(self, request: Request):
+        route = request.scope.get("route")
+        key = f"{request.method} {route.path if route else request.url.path}"
+        is_write = request.method != "GET"
+        limit = self.write_limit if is_write else self.read_limit
+
+        if self._in_flight[key] >= limit:
+            metrics.increment("requests_rejected")
+            raise Overloaded(f"Too many concurrent requests for {key}", 429)
+
+        if is_write and self._writes >= self.worker_write_limit:
+            metrics.increment("writes_rejected")
+            raise Overloaded("Too many writes in progress, try again later")
+
+        self._in_flight[key] += 1
+        self._writes += is_write
+        try:
+            yield
+        finally:
+            self._in_flight[key] -= 1
+            self._writes -= is_write
+
+    def in_flight(self) -> dict:
+        """
+        Number of requests each route is handling
+        :return: in flight requests by route
+        """
+
+        return {key: count for key, count in self._in_flight.items() if count}
+
+
+def size_threadpool(size: int = config.THREADPOOL_SIZE):
+    """
+    Set the number of threads sync handlers of this worker run in, call
+    from the event loop
+    :param size: number of threads
+    """
+
+    anyio.to_thread.current_default_thread_limiter().total_tokens = size
+
+
+def threadpool_usage() -> dict:
+    """
+    Threads of the shared threadpool in use and requests waiting for one,
+    call from the event loop
+    :return: size, busy threads and waiting requests
+    """
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+
+    return {
+        "size": limiter.total_tokens,
+        "busy": limiter.borrowed_tokens,
+        "waiting": limiter.statistics().tasks_waiting,
+    }
+
+
+admission_control = ConcurrencyLimiter(
+    config.READ_CONCURRENCY_LIMIT,
+    config.WRITE_CONCURRENCY_LIMIT,
+    config.WORKER_WRITE_LIMIT,
+)
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Callable, Optional
+
+import config
+from utils.metrics import metrics
+
+
+class Subscription:
+    """
+    Buffer of messages for one subscriber, None marks the end of the stream
+    """
+
+    def __init__(self, buffer_size: int, matches: Optional[Callable] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.matches = matches
+        self.evicted = False
+
+
+class Broadcaster:
+    """
+    Fans messages out to in-process subscribers. Each subscriber has a
+    bounded buffer, a subscriber that falls behind is evicted instead of
+    slowing down the others. Must be used from the event loop.
+    """
+
+    def __init__(self, buffer_size: int = config.CHANGE_STREAM_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._subscriptions: set = set()
+
+    def subscribe(self, matches: Optional[Callable] = None) -> Subscription:
+        """
+        Start receiving messages
+        :param matches: only receive messages this returns True for
+        :return: subscription
+        """
+
+        subscription = Subscription(self.buffer_size, matches)
+        self._subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Stop receiving messages
+        :param subscription: subscription to end
+        """
+
+        self._subscriptions.discard(subscription)
+
+    def publish(self, message):
+        """
+        Send a message to every matching subscriber
+        :param message: message
+        """
+
+        for subscription in list(self._subscriptions):
+            if subscription.matches is not None and not subscription.matches(message):
+                continue
+
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._evict(subscription)
+
+    def subscriber_count(self) -> int:
+        """
+        Number of active subscribers
+        :return: subscribers
+        """
+
+        return len(self._subscriptions)
+
+    def _evict(self, subscription: Subscription):
+        self.unsubscribe(subscription)
+        subscription.evicted = True
+        metrics.increment("subscribers_evicted")
+
+        # drop the backlog and end the stream
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+
+        subscription.queue.put_nowait(None)
+
+
+change_stream = Broadcaster()
@@ -0,0 +1,80 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import inspect
+
+
+def parse_fields(fields: Optional[str]) -> Optional[dict]:
+    """
+    Parse a comma separated fields query parameter into a tree, nested
+    fields use dots e.g. "name,roles.company.name" becomes
+    {"name": {}, "roles": {"company": {"name": {}}}}
+    :param fields: fields query parameter
+    :return: field tree, None when all fields are requested
+    """
+
+    if not fields:
+        return None
+
+    tree = {}
+    for field in fields.split(","):
+        node = tree
+        for part in field.strip().split("."):
+            if part:
+                node = node.setdefault(part, {})
+
+    return tree or None
+
+
+def model_columns(model, tree: Optional[dict], nested: tuple = ()) -> list:
+    """
+    Get the columns of a model to select for the requested fields, the
+    primary key is always selected
+    :param model: table model
+    :param tree: field tree, None or empty for all columns
+    :param nested: names of nested objects that can be requested as well
+    :return: column attributes
+    """
+
+    mapper = inspect(model)
+    names = [column.key for column in mapper.column_attrs]
+
+    if not tree:
+        return [getattr(model, name) for name in names]
+
+    unknown = [field for field in tree if field not in names and field not in nested]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail={"fields": [f"Unknown field {field}" for field in unknown]},
+        )
+
+    primary_keys = [column.key for column in mapper.primary_key]
+
+    return [
+        getattr(model, name) for name in names if name in tree or name in primary_keys
+    ]
+
+
+def prune(data, tree: Optional[dict]):
+    """
+    Drop everything from a response that was not requested, ids are kept
+    :param data: dict or list of dicts
+    :param tree: field tree, None or empty to keep everything
+    :return: pruned data
+    """
+
+    if not tree:
+        return data
+
+    if isinstance(data, list):
+        return [prune(item, tree) for item in data]
+
+    if not isinstance(data, dict):
+        return data
+
+    return {
+        key: prune(value, tree.get(key))
+        for key, value in data.items()
+        if key in tree or key == "id"
+    }
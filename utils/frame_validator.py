@@ -0,0 +1,156 @@
+from typing import TYPE_CHECKING
+
+from marshmallow import Schema, ValidationError, fields, validate
+
+if TYPE_CHECKING:
+    import polars as pl
+
+# values matching these are valid for marshmallow as well, anything else is
+# handed to the marshmallow field so the error messages stay the same
+EMAIL_PATTERN = (
+    r"^[A-Za-z0-9_%+-]+(\.[A-Za-z0-9_%+-]+)*"
+    r"@([A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,6}$"
+)
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+DATE_ORDER_ERROR = "End date must be on or after the start date"
+
+
+def check_date_order(data: dict, start: str, end: str):
+    """
+    Check that an end date is not before its start date
+    :param data: deserialized data
+    :param start: start date field
+    :param end: end date field
+    """
+
+    if data.get(start) is not None and data.get(end) is not None:
+        if data[end] < data[start]:
+            raise ValidationError(DATE_ORDER_ERROR, end)
+
+
+def _add_errors(errors: dict, rows, field_name: str, messages: list):
+    for row in rows:
+        errors.setdefault(row, {}).setdefault(field_name, []).extend(messages)
+
+
+def _validate_column(
+    field: fields.Field, field_name: str, column: "pl.Series", errors: dict
+) -> "pl.Series":
+    import polars as pl
+
+    null = column.is_null()
+    present = ~null
+    none = pl.Series([False] * len(column))
+
+    if not field.allow_none:
+        _add_errors(errors, null.arg_true(), field_name, [field.error_messages["null"]])
+
+    # rows known to deserialize, and rows marshmallow has to look at
+    is_string = column.dtype == pl.Utf8
+    parsed = column
+
+    if type(field) in (fields.Str, fields.String) and is_string:
+        ok = present
+    elif isinstance(field, fields.Email) and is_string:
+        ok = present & column.str.contains(EMAIL_PATTERN).fill_null(False)
+    elif type(field) is fields.Date and column.dtype == pl.Date:
+        ok = present
+    elif type(field) is fields.Date and is_string:
+        parsed = column.str.to_date("%Y-%m-%d", strict=False)
+        ok = present & column.str.contains(DATE_PATTERN).fill_null(False)
+        ok = ok & parsed.is_not_null()
+    else:
+        ok = none
+
+    fallback = present & ~ok
+
+    for validator in field.validators:
+        if isinstance(validator, validate.Email) and isinstance(field, fields.Email):
+            # covered by EMAIL_PATTERN
+            continue
+
+        if (
+            isinstance(validator, validate.Length)
+            and is_string
+            and validator.equal is None
+            and validator.error is not None
+            and "{" not in validator.error
+        ):
+            lengths = column.str.len_chars()
+            invalid = none
+
+            if validator.min is not None:
+                invalid = invalid | (lengths < validator.min).fill_null(False)
+            if validator.max is not None:
+                invalid = invalid | (lengths > validator.max).fill_null(False)
+
+            _add_errors(
+                errors, (ok & invalid).arg_true(), field_name, [validator.error]
+            )
+            continue
+
+        # no vectorized version of this validator
+        fallback = fallback | ok
+        ok = none
+
+    # let marshmallow deserialize the rest one by one
+    rows = fallback.arg_true().to_list()
+    values = []
+
+    for row in rows:
+        try:
+            values.append(field.deserialize(column[row]))
+        except ValidationError as exc:
+            values.append(None)
+            messages = exc.messages
+            _add_errors(
+                errors,
+                [row],
+                field_name,
+                messages if isinstance(messages, list) else [messages],
+            )
+
+    if rows and type(field) is fields.Date:
+        parsed = parsed.cast(pl.Date, strict=False).scatter(rows, values)
+
+    return parsed
+
+
+def validate_frame(schema: Schema, frame: "pl.DataFrame") -> dict:
+    """
+    Validate every row of a data frame against a marshmallow schema at once,
+    gives the same errors as calling schema.validate on each row
+    :param schema: marshmallow schema
+    :param frame: one column per field
+    :return: errors of each invalid row, keyed by row index
+    """
+
+    errors = {}
+    columns = {}
+
+    for field_name, field in schema.load_fields.items():
+        name = field.data_key or field_name
+
+        if name not in frame.columns:
+            if field.required:
+                _add_errors(
+                    errors,
+                    range(frame.height),
+                    name,
+                    [field.error_messages["required"]],
+                )
+            continue
+
+        columns[name] = _validate_column(field, name, frame[name], errors)
+
+    # schema level rules only run on rows without field errors
+    date_order = getattr(schema.Meta, "date_order", None)
+
+    if date_order is not None and all(name in columns for name in date_order):
+        start, end = (columns[name] for name in date_order)
+        invalid = (end < start).fill_null(False)
+        rows = [row for row in invalid.arg_true().to_list() if row not in errors]
+        _add_errors(errors, rows, date_order[1], [DATE_ORDER_ERROR])
+
+    return {row: errors[row] for row in sorted(errors)}
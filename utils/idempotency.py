@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import time
+from typing import Optional
+
+from sqlmodel import Session
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+import config
+from db import get_engine
+from db.coalescer import write_coalescer
+from db.idempotency import claim_key, complete_key, get_key, release_key
+from utils.admission import Overloaded, overloaded_response
+from utils.metrics import metrics
+
+METHODS = ("POST", "PUT")
+MAX_KEY_LENGTH = 255
+
+# seconds between checks on a duplicate running in another worker
+POLL_INTERVAL = 0.05
+
+
+async def read_body(receive: Receive) -> bytes:
+    chunks = []
+
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def should_store(status_code: int) -> bool:
+    # server errors and rejections under load are worth retrying
+    return status_code < 500 and status_code != 429
+
+
+class IdempotencyMiddleware:
+    """
+    Replays the stored response of POST and PUT requests that repeat an
+    Idempotency-Key header, instead of running them again. A duplicate of a
+    request that is still running waits for it and gets its response.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._in_flight: dict = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = Headers(scope=scope).get("idempotency-key")
+
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                status_code=400,
+                content={
+                    "detail": {
+                        "Idempotency-Key": [
+                            f"Must be between 1 and {MAX_KEY_LENGTH} characters"
+                        ]
+                    }
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        body = await read_body(receive)
+        request_hash = hashlib.sha256(body).hexdigest()
+        # the query string is part of the request, ?dry_run=true must not
+        # replay for the real request
+        query_string = scope["query_string"].decode("latin-1")
+        key = f"{scope['method']} {scope['path']}?{query_string} {idempotency_key}"
+
+        try:
+            response = await self._replay_or_claim(key, request_hash)
+        except Overloaded as exc:
+            # raised outside the app, its exception handlers do not apply
+            response = overloaded_response(exc)
+
+        if response is not None:
+            await response(scope, receive, send)
+            return
+
+        await self._run(key, body, scope, receive, send)
+
+    async def _replay_or_claim(self, key: str, request_hash: str) -> Optional[Response]:
+        deadline = time.monotonic() + config.IDEMPOTENCY_WAIT_TIMEOUT
+
+        def claim(session: Session) -> bool:
+            return claim_key(
+                session,
+                key,
+                request_hash,
+                config.IDEMPOTENCY_TTL,
+                config.IDEMPOTENCY_WAIT_TIMEOUT,
+            )
+
+        while True:
+            # duplicate of a request running in this worker
+            event = self._in_flight.get(key)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(
+                        event.wait(), max(deadline - time.monotonic(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    return self._still_running()
+
+            stored = await asyncio.to_thread(self._get, key)
+
+            if stored is not None and stored.request_hash != request_hash:
+                return JSONResponse(
+                    status_code=422,
+                    content={
+                        "detail": "Idempotency-Key was already used with a "
+                        "different request"
+                    },
+                )
+
+            if stored is not None and stored.status_code is not None:
+                metrics.increment("idempotent_replays")
+
+                return Response(
+                    content=stored.body,
+                    status_code=stored.status_code,
+                    media_type=stored.content_type,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+            if key not in self._in_flight:
+                if await asyncio.to_thread(write_coalescer.run, claim):
+                    self._in_flight[key] = asyncio.Event()
+                    return None
+
+            # running in another worker
+            if time.monotonic() >= deadline:
+                return self._still_running()
+
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def _run(
+        self, key: str, body: bytes, scope: Scope, receive: Receive, send: Send
+    ):
+        received = False
+        status_code = None
+        content_type = None
+        chunks = []
+
+        async def receive_body():
+            nonlocal received
+
+            # the body was read already, only a disconnect can follow
+            if received:
+                return await receive()
+
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            nonlocal status_code, content_type
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message["headers"]).get("content-type")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, capture)
+        finally:
+
+            def save(session: Session):
+                if status_code is not None and should_store(status_code):
+                    response_body = b"".join(chunks)
+                    complete_key(session, key, status_code, content_type, response_body)
+                else:
+                    release_key(session, key)
+
+            try:
+                await asyncio.to_thread(write_coalescer.run, save)
+            except Overloaded:
+                # the claim expires after IDEMPOTENCY_WAIT_TIMEOUT
+                pass
+
+            self._in_flight.pop(key).set()
+
+    def _get(self, key: str):
+        with Session(get_engine()) as session:
+            return get_key(session, key)
+
+    def _still_running(self) -> Response:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": "A request with this Idempotency-Key is in progress"},
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)},
+        )
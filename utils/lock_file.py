@@ -0,0 +1,63 @@
+import os
+from contextlib import suppress
+from typing import Optional
+
+
+def lock_owner(path: str) -> Optional[int]:
+    """
+    Get the process holding a lock file
+    :param path: lock file
+    :return: pid of the live process holding it, None if nobody does
+    """
+
+    try:
+        with open(path) as file:
+            pid = int(file.read() or 0)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+
+    return pid
+
+
+def take_lock(path: str) -> bool:
+    """
+    Take a lock shared by the processes of this host, a lock left behind by
+    a process that died is taken over
+    :param path: lock file
+    :return: whether this process holds the lock now
+    """
+
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if lock_owner(path) is not None:
+                return False
+
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            continue
+
+        with os.fdopen(fd, "w") as file:
+            file.write(str(os.getpid()))
+
+        return True
+
+    return False
+
+
+def release_lock(path: str):
+    """
+    Let go of a lock taken with take_lock
+    :param path: lock file
+    """
+
+    if lock_owner(path) == os.getpid():
+        os.remove(path)
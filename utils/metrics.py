@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Get a percentile of a list of values
+    :param values: values, need not be sorted
+    :param fraction: percentile between 0 and 1
+    :return: value at the percentile
+    """
+
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def summarize(values: list) -> dict:
+    """
+    Summarize a list of samples
+    :param values: values, need not be sorted
+    :return: count, percentiles and maximum, empty if there are no values
+    """
+
+    if not values:
+        return {}
+
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.5), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(max(values), 3),
+    }
+
+
+class Metrics:
+    """
+    Counters and recent samples of this worker process
+    """
+
+    def __init__(self, window: int = 4096):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+
+    def increment(self, name: str, value: int = 1):
+        """
+        Increase a counter
+        :param name: counter name
+        :param value: amount to add
+        """
+
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float):
+        """
+        Record a sample e.g. a duration
+        :param name: sample name
+        :param value: sample value
+        """
+
+        with self._lock:
+            self._samples[name].append((time.monotonic(), value))
+
+    def samples(
+        self, name: str, since: float = 0, until: Optional[float] = None
+    ) -> list:
+        """
+        Get the recent values of a sample
+        :param name: sample name
+        :param since: only values recorded after this time.monotonic()
+        :param until: only values recorded before this time.monotonic()
+        :return: values
+        """
+
+        with self._lock:
+            return [
+                value
+                for at, value in self._samples[name]
+                if at >= since and (until is None or at < until)
+            ]
+
+    def snapshot(self) -> dict:
+        """
+        Get all counters and a summary of the recent samples
+        :return: metrics
+        """
+
+        with self._lock:
+            counters = dict(self._counters)
+            names = list(self._samples)
+
+        summaries = {}
+        for name in names:
+            summary = summarize(self.samples(name))
+
+            if summary:
+                summaries[name] = summary
+
+        return {"counters": counters, "samples": summaries}
+
+
+metrics = Metrics()
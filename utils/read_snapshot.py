@@ -0,0 +1,42 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from db.engine import reset_read_engine, use_read_engine
+from db.snapshot import read_snapshot
+
+
+class ReadSnapshotMiddleware:
+    """
+    Sends GET requests to the read snapshot while it is fresh enough. A
+    Read-Your-Writes: true header reads from the primary instead, for clients
+    that need to see their own writes straight away.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        engine = read_snapshot.engine()
+
+        if engine is None or headers.get("read-your-writes", "").lower() == "true":
+            await self.app(scope, receive, send)
+            return
+
+        age = read_snapshot.age()
+
+        async def send_with_age(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Snapshot-Age"] = f"{age:.3f}"
+
+            await send(message)
+
+        token = use_read_engine(engine)
+        try:
+            await self.app(scope, receive, send_with_age)
+        finally:
+            reset_read_engine(token)
@@ -0,0 +1,30 @@
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.metrics import metrics
+
+
+class RequestTimerMiddleware:
+    """
+    Records the time until the response of each request starts as the
+    request_ms sample
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.monotonic()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                metrics.observe("request_ms", (time.monotonic() - start) * 1000)
+
+            await send(message)
+
+        await self.app(scope, receive, send_timed)
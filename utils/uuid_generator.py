@@ -1,5 +1,44 @@
+import os
+import threading
+import time
 import uuid
 
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a time ordered UUID (version 7), ids generated later always sort
+    after earlier ones so inserts land at the end of the primary key index
+    :return: UUID
+    """
+
+    global _last_ms, _counter
+
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+
+        # 12 bit counter keeps ids created in the same millisecond ordered
+        if ms > _last_ms:
+            _last_ms = ms
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _counter += 1
+
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+
+        ms = _last_ms
+        counter = _counter
+
+    rand = int.from_bytes(os.urandom(8), "big") & 0x3FFFFFFFFFFFFFFF
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0x2 << 62) | rand
+
+    return uuid.UUID(int=value)
+
 
 def uuid_generator() -> str:
     """
@@ -7,4 +46,4 @@ def uuid_generator() -> str:
     :return: UUID string
     """
 
-    return str(uuid.uuid4())
+    return str(uuid7())